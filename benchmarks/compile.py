@@ -0,0 +1,47 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+Measures the speedup of compiled formulas on a sweep of inputs.
+
+Evaluates the econ factor formulas for a grid of inputs with evaluate_many(), once as plain
+Python and once compiled (register_formula(..., compile=True)). Run with: python -m benchmarks.compile
+"""
+import sys
+import time
+
+from formula_prompt import evaluate_many, NumInput, PercentInput
+from formula_prompt.compiler import numpy
+from formula_prompt.core import Formula
+from formula_prompt.setup import _compile
+
+NUMBER_OF_ROWS = 200_000
+
+
+def geometric_factor(N, i, g):
+    factor = (((1 + g) / (1 + i)) ** N - 1) / (g - i)
+    return {"P/geom": factor, "geom/P": 1 / factor}
+
+
+def tax_factors(t, d, i):
+    return {"CRF": 1 - t * d / (i + d), "CTF": 1 - t * d / (i + d) * (1 + i / 2) / (1 + i)}
+
+
+def measure(formula, rows):
+    start = time.perf_counter()
+    evaluate_many(formula, rows, backend="serial")
+    return time.perf_counter() - start
+
+
+def main(count=NUMBER_OF_ROWS):
+    rows = [(1 + n % 40, 0.01 + (n % 97) / 1000, 0.0055 + (n % 89) / 1000) for n in range(count)]
+    print(f"NumPy: {'installed' if numpy is not None else 'not installed (compiled formulas evaluate row by row)'}")
+    for func in (geometric_factor, tax_factors):
+        inputs = (NumInput("a"), PercentInput("b"), PercentInput("c"))
+        plain = Formula(func, inputs, func.__name__)
+        compiled = Formula(func, inputs, func.__name__, call=_compile(func, inputs, func.__name__))
+        plain_time, compiled_time = measure(plain, rows), measure(compiled, rows)
+        print(f"{func.__name__}: {count} rows, plain {plain_time:.3f}s, compiled {compiled_time:.3f}s "
+              f"({plain_time / compiled_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else NUMBER_OF_ROWS)
@@ -0,0 +1,48 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+Measures the time to import formula_prompt and fails if it's over budget.
+
+Each statement runs in a fresh interpreter (so nothing is already imported) several times and the
+fastest run is kept. Exits with status 1 if a statement takes longer than its budget.
+Run with: python -m benchmarks.import_time
+"""
+import subprocess
+import sys
+
+RUNS = 7
+
+# Statement -> budget in milliseconds. Before the package imported lazily, each of these took 100-140 ms.
+BUDGETS = {
+    # Using the package as a library
+    "import formula_prompt": 10,
+    "from formula_prompt import register_formula, NumInput": 40,
+    "from formula_prompt import evaluate_many": 40,
+    # Everything, as the prompt does
+    "from formula_prompt import *": 150,
+}
+
+_TIMER = "import time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start)"
+
+
+def measure(statement, runs=RUNS):
+    """Returns the fastest time in milliseconds to run the statement in a new interpreter."""
+    times = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", _TIMER.format(statement=statement)],
+                                check=True, capture_output=True, text=True).stdout
+        times.append(float(output) * 1000)
+    return min(times)
+
+
+def main():
+    over_budget = False
+    for statement, budget in BUDGETS.items():
+        elapsed = measure(statement)
+        status = "ok" if elapsed <= budget else "OVER BUDGET"
+        over_budget |= elapsed > budget
+        print(f"{statement}: {elapsed:.1f} ms (budget {budget} ms) {status}")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+Measures the memory used per registered formula.
+
+Registers a large number of formulas (with two inputs each, spread over nested folders)
+and reports the memory allocated per formula. Run with: python -m benchmarks.memory
+"""
+import sys
+import tracemalloc
+
+from formula_prompt import register_formula, NumInput, IntInput
+
+NUMBER_OF_FORMULAS = 20_000
+FORMULAS_PER_FOLDER = 10
+
+
+def formula(x, n):
+    return x * n
+
+
+def register_formulas(count):
+    for i in range(count):
+        register_formula([NumInput("x"), IntInput("n", min=0)],
+                         name=f"pack.folder{i // FORMULAS_PER_FOLDER}.formula{i}")(formula)
+
+
+def main(count=NUMBER_OF_FORMULAS):
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    register_formulas(count)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{count} formulas: {(after - before) / 1024 ** 2:.2f} MiB, {(after - before) / count:.0f} bytes per formula")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else NUMBER_OF_FORMULAS)
@@ -39,7 +39,7 @@ def find_yield(P, A, N, F):
 @register_formula([
     NumInput("number of periods"),
     PercentInput("rate")
-])
+], compile=True)
 def annuity_factor(N, r):
     factor = (1 - (1 + r) ** (-N)) / r
     return {"P/A": factor, "A/P": 1 / factor}
@@ -48,7 +48,7 @@ def annuity_factor(N, r):
     NumInput("number of periods"),
     PercentInput("rate"),
     PercentInput("gradient rate")
-], name="factors.geometric gradient")
+], name="factors.geometric gradient", compile=True)
 def geometric_factor(N, i, g):
     factor = (((1 + g) / (1 + i)) ** N - 1) / (g - i)
     return {"P/geom": factor, "geom/P": 1 / factor}
@@ -58,7 +58,7 @@ def geometric_factor(N, i, g):
     PercentInput("tax rate (t)"),
     PercentInput("CCA (depreciation) rate (d)"),
     PercentInput("interest rate (normally after-tax actual MARR/IRR) (i)")
-], name="factors.CRF/CTF")
+], name="factors.CRF/CTF", compile=True)
 def tax_factors(t, d, i):
     return {"CRF": 1 - t * d / (i + d), "CTF": 1 - t * d / (i + d) * (1 + i / 2) / (1 + i)}
 
@@ -66,7 +66,7 @@ def tax_factors(t, d, i):
 @register_formula([
     NumInput("number of periods (n)"),
     PercentInput("rate (percent)")
-], name="factors.annual")
+], name="factors.annual", compile=True)
 def annual_factor(N, i):
     factor = (1 - (1+i) ** (-N)) / i
     return {"P/A": factor, "A/P": 1 / factor}
@@ -74,7 +74,7 @@ def annual_factor(N, i):
 @register_formula([
     NumInput("n"),
     PercentInput("rate")
-], name="factors.future")
+], name="factors.future", compile=True)
 def future_factor(N, i):
     factor = (1+i) ** N
     return { "P/F": 1 / factor , "F/P": factor }
@@ -82,7 +82,7 @@ def future_factor(N, i):
 @register_formula([
     NumInput("n"),
     PercentInput("rate")
-], name="factors.arithmetic_grad")
+], name="factors.arithmetic_grad", compile=True)
 def arithmetic_gradient_factor(N, i):
     factor = (1 - (1 + i * N) / (1 + i) ** N) / (i ** 2)
     return { "P/G": factor, "G/P": 1 / factor }
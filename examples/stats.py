@@ -9,6 +9,7 @@ Note that the formula names are indicated in @register_formula(..., name=<>).
 """
 
 from formula_prompt import *
+from formula_prompt.precision import comb, power
 
 import math
 from scipy import stats
@@ -63,7 +64,7 @@ def sort(x):
     IntInput("n"),
     NumInput("p")
 ],
-    name="distributions.binomial"
+    name="distributions.binomial", exact=True
 )
 def binomial_distribution(x, n, p):
     """
@@ -73,16 +74,17 @@ def binomial_distribution(x, n, p):
     a coin n times and the likeliness of getting heads on any one flip is p.
 
     The equation used is nCx * p ^ x * (1-p) ^ (n-x).
+    Use the log precision for large n (nCx no longer fits in a float).
     """
-    return math.comb(n, x) * (p ** x) * ((1 - p) ** (n - x))
+    return comb(n, x) * power(p, x) * power(1 - p, n - x)
 
 
-@register_formula([
+@register_cumulative(binomial_distribution, [
     IntInput("x"),
     IntInput("n"),
     NumInput("p")
 ],
-    name="distributions.binomial.cumulative"
+    name="distributions.binomial.cumulative", exact=True
 )
 def binomial_distribution_cumulative(x, n, p):
     """
@@ -91,9 +93,10 @@ def binomial_distribution_cumulative(x, n, p):
     Equivalent to finding the probability of getting between 0 and x heads
     when flipping a coin n times and the likeliness of getting heads on any one flip is p.
 
-    Found by summing the binomial distribution from 0 up to x.
+    Found by summing the binomial distribution from 0 up to x where each term is
+    found from the previous one using b(x+1; n, p) / b(x; n, p) = (n-x)/(x+1) * p/(1-p).
     """
-    return sum([binomial_distribution(i, n, p) for i in range(0, x + 1)])
+    return (n - x) * p / ((x + 1) * (1 - p))
 
 
 @register_formula([
@@ -101,7 +104,7 @@ def binomial_distribution_cumulative(x, n, p):
     IntInput("N"),
     IntInput("n"),
     IntInput("k")
-], name="distributions.hypergeometric")
+], name="distributions.hypergeometric", exact=True)
 def hypergeometric_dist(x, N, n, k):
     """
     Evaluate the hypergeometric distribution h(x; N, n, k) as defined in the textbook.
@@ -111,14 +114,14 @@ def hypergeometric_dist(x, N, n, k):
 
     Found with the equation kCx * (N-k)C(n-x) / NCn
     """
-    return math.comb(k, x) * math.comb(N - k, n - x) / math.comb(N, n)
+    return comb(k, x) * comb(N - k, n - x) / comb(N, n)
 
 
 @register_formula([
     IntInput("x"),
     IntInput("k"),
     NumInput("p")
-], name="distributions.negative_binomial")
+], name="distributions.negative_binomial", exact=True)
 def negative_binomial(x, k, p):
     """
     Evaluate the negative binomial distribution b*(x; k, p) as defined in the textbook.
@@ -128,20 +131,22 @@ def negative_binomial(x, k, p):
 
     Found with the equation (x-1)C(k-1) * p^k * (1 - p)^(x - k)
     """
-    return math.comb(x - 1, k - 1) * (p ** k) * ((1 - p) ** (x - k))
+    return comb(x - 1, k - 1) * power(p, k) * power(1 - p, x - k)
 
 
-@register_formula([
+@register_cumulative(negative_binomial, [
     IntInput("x"),
     IntInput("k"),
     NumInput("p")
-], name="distributions.negative_binomial.cumulative")
+], name="distributions.negative_binomial.cumulative", start=lambda k, p: k, exact=True)
 def negative_binomial_cumulative(x, k, p):
     """
     Evaluate the cumulative negative binomial distribution by summing
     the negative binomial distribution from k to x (inclusive).
+
+    Each term is found from the previous one using b*(x+1; k, p) / b*(x; k, p) = x/(x-k+1) * (1-p).
     """
-    return sum([negative_binomial(xi, k, p) for xi in range(k, x + 1)])
+    return x * (1 - p) / (x - k + 1)
 
 
 @register_formula([
@@ -158,7 +163,7 @@ def poisson_dist(x, m):
     return math.exp(-m) * (m ** x) / math.factorial(x)
 
 
-@register_formula([
+@register_cumulative(poisson_dist, [
     IntInput("x"),
     NumInput("mu"),
 ], name="distributions.poisson.cumulative")
@@ -166,8 +171,10 @@ def poisson_dist_cumulative(x, m):
     """
     Evaluate the cumulative poisson distribution P(x; m) by summing the
     poisson distribution (defined above) from 0 up to x (inclusive).
+
+    Each term is found from the previous one using p(x+1; m) / p(x; m) = m/(x+1).
     """
-    return sum([poisson_dist(i, m) for i in range(0, x + 1)])
+    return m / (x + 1)
 
 
 @register_formula([
@@ -184,7 +191,8 @@ def std_normal_dist_cumulative(lower, upper):
     return find_distribution_area(stats.norm, lower, upper)
 
 
-@register_formula([NumInput("alpha")], name="distributions.normal.inverse")
+@register_formula([NumInput("alpha")], name="distributions.normal.inverse",
+                  table=LookupTable(points=4096, tolerance=1e-5, ranges={"alpha": (0, 1)}))
 def normal_dist_inverse(a):
     """
     Given an area 'a', return the z-value that if taken as a lower bound
@@ -235,7 +243,8 @@ def gamma_dist(lower, upper, a, b):
 @register_formula([
     IntInput("v"),
     NumInput("alpha")
-], name="distributions.chi2.inverse")
+], name="distributions.chi2.inverse",
+    table=LookupTable(points=1024, tolerance=1e-5, ranges={"v": (1, 30), "alpha": (0, 1)}))
 def inv_chi2_distribution(v, a):
     """
     Given an area 'a', return the value that if taken as a lower bound
@@ -262,7 +271,8 @@ def chi2_cuml(v, lower, upper):
 @register_formula([
     NumInput("v"),
     NumInput("alpha")
-], name="distributions.t.inverse")
+], name="distributions.t.inverse",
+    table=LookupTable(points=256, tolerance=1e-5, ranges={"v": (1, 30), "alpha": (0, 0.5)}))
 def inverse_t_dist(v, a):
     """
     Given an area 'a', return the value that if taken as a lower bound
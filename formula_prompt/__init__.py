@@ -1,5 +1,48 @@
 #  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+The modules of the package are only imported when one of their names is first used
+(e.g. 'from formula_prompt import evaluate_many' doesn't import the prompt's modules).
+"""
+import importlib
 
-from formula_prompt.setup import register_formula, launch_prompt
-from formula_prompt.inputs import IntInput, NumInput, ListInput, PercentInput
-from formula_prompt.core import UserInputError
\ No newline at end of file
+# Public name -> module defining it
+_EXPORTS = {
+    "register_formula": "formula_prompt.setup",
+    "register_cumulative": "formula_prompt.setup",
+    "launch_prompt": "formula_prompt.setup",
+    "get_formula": "formula_prompt.setup",
+    "IntInput": "formula_prompt.inputs",
+    "NumInput": "formula_prompt.inputs",
+    "ListInput": "formula_prompt.inputs",
+    "PercentInput": "formula_prompt.inputs",
+    "UserInputError": "formula_prompt.core",
+    "Bounds": "formula_prompt.signatures",
+    "Percent": "formula_prompt.signatures",
+    "Session": "formula_prompt.session",
+    "LookupTable": "formula_prompt.tables",
+    "evaluate_many": "formula_prompt.executor",
+    "evaluate_file": "formula_prompt.ingest",
+    "simulate": "formula_prompt.simulation",
+    "Normal": "formula_prompt.simulation",
+    "LogNormal": "formula_prompt.simulation",
+    "Uniform": "formula_prompt.simulation",
+    "Triangular": "formula_prompt.simulation",
+    "Choice": "formula_prompt.simulation",
+    "History": "formula_prompt.history",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module), name)
+    # Cache the value so __getattr__ is only called once per name
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
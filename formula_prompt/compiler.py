@@ -0,0 +1,257 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+compiler.py compiles arithmetic formulas into kernels (used by register_formula(..., compile=True)).
+
+The formula is called once with symbolic inputs that record every operation into an expression
+graph. Identical operations on identical operands are only recorded once, so subexpressions that
+the formula computes several times (e.g. (1 + i) ** N) are computed once by the kernel.
+The graph is then turned into Python source where subexpressions used once are fused
+into the expression that uses them.
+
+The kernel is called like the formula. kernel.batch(rows) evaluates many rows at once: with NumPy
+installed, the same kernel runs on whole columns (converted to float64) a chunk of rows at a time
+so the temporary arrays stay in the CPU cache. Chunks where NumPy reports an invalid operation
+(e.g. a division by zero) are evaluated row by row instead so errors are the same as without NumPy.
+
+Only formulas made of +, -, *, /, //, %, ** and abs() on their inputs and numbers can be compiled.
+The formula must return the same operations every time (no if on an input, no loops depending on an
+input, no math functions) and have no side effects. Results can be a number or a dict of numbers.
+"""
+import math
+import numbers
+from operator import itemgetter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Rows evaluated at once by kernel.batch()
+BATCH_CHUNK_SIZE = 4096
+# Integers above this (in absolute value) lose precision as floats so they're evaluated row by row
+_MAX_EXACT_INTEGER = 2 ** 53
+
+_BINARY_OPERATORS = {"add": "+", "sub": "-", "mul": "*", "truediv": "/", "floordiv": "//", "mod": "%", "pow": "**"}
+_UNARY_OPERATORS = {"neg": "-", "pos": "+"}
+# Operators for which a op b == b op a exactly (also in floating point)
+_COMMUTATIVE = {"add", "mul"}
+
+
+def compile_formula(func, number_of_inputs):
+    """
+    Returns a kernel computing the same results as func(*inputs).
+
+    :raises TypeError: If func uses operations that can't be compiled
+    """
+    graph = _Graph()
+    inputs = [graph.node("input", (i,)) for i in range(number_of_inputs)]
+    try:
+        result = func(*inputs)
+    except _NotTraceable as e:
+        raise TypeError(str(e)) from None
+
+    if isinstance(result, dict):
+        outputs = {key: graph.constant(value) for key, value in result.items()}
+    else:
+        outputs = graph.constant(result)
+    return _generate(graph, number_of_inputs, outputs)
+
+
+class _NotTraceable(TypeError):
+    pass
+
+
+class _Node:
+    """A value computed by the formula. Operations on nodes create new nodes in the graph."""
+    __slots__ = ("graph", "index", "operation", "arguments")
+
+    def __init__(self, graph, index, operation, arguments):
+        self.graph = graph
+        self.index = index  # Position in the graph, a node always comes after its arguments
+        self.operation = operation
+        self.arguments = arguments
+
+    def _binary(self, operation, other, reverse=False):
+        if not _is_number(other) and not isinstance(other, _Node):
+            return NotImplemented
+        other = self.graph.constant(other)
+        return self.graph.node(operation, (other, self) if reverse else (self, other))
+
+    def __add__(self, other): return self._binary("add", other)
+    def __radd__(self, other): return self._binary("add", other, reverse=True)
+    def __sub__(self, other): return self._binary("sub", other)
+    def __rsub__(self, other): return self._binary("sub", other, reverse=True)
+    def __mul__(self, other): return self._binary("mul", other)
+    def __rmul__(self, other): return self._binary("mul", other, reverse=True)
+    def __truediv__(self, other): return self._binary("truediv", other)
+    def __rtruediv__(self, other): return self._binary("truediv", other, reverse=True)
+    def __floordiv__(self, other): return self._binary("floordiv", other)
+    def __rfloordiv__(self, other): return self._binary("floordiv", other, reverse=True)
+    def __mod__(self, other): return self._binary("mod", other)
+    def __rmod__(self, other): return self._binary("mod", other, reverse=True)
+    def __pow__(self, other): return self._binary("pow", other)
+    def __rpow__(self, other): return self._binary("pow", other, reverse=True)
+    def __neg__(self): return self.graph.node("neg", (self,))
+    def __pos__(self): return self.graph.node("pos", (self,))
+    def __abs__(self): return self.graph.node("abs", (self,))
+
+    def _not_traceable(self, *args):
+        raise _NotTraceable("The formula can only use arithmetic operators and abs() on its inputs "
+                            "(no comparisons, conditions, loops or math functions).")
+
+    __bool__ = __float__ = __int__ = __index__ = __complex__ = __round__ = _not_traceable
+    __lt__ = __le__ = __gt__ = __ge__ = __eq__ = __ne__ = _not_traceable
+    __hash__ = object.__hash__
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+class _Graph:
+    def __init__(self):
+        self.nodes = []
+        # (operation, arguments) -> node, so that identical operations give the same node
+        self._known = {}
+
+    def node(self, operation, arguments, key=None):
+        if operation in _COMMUTATIVE:
+            arguments = tuple(sorted(arguments, key=lambda argument: argument.index))
+        if key is None:
+            key = (operation, tuple(argument.index if isinstance(argument, _Node) else argument
+                                    for argument in arguments))
+        node = self._known.get(key)
+        if node is None:
+            node = _Node(self, len(self.nodes), operation, arguments)
+            self.nodes.append(node)
+            self._known[key] = node
+        return node
+
+    def constant(self, value):
+        if isinstance(value, _Node):
+            return value
+        if not _is_number(value):
+            raise TypeError(f"The formula returned {value!r}, only numbers or dicts of numbers can be compiled.")
+        # Constants are told apart by type and repr since 1 == 1.0 and 0.0 == -0.0 but they don't give the same results
+        return self.node("constant", (type(value), value), key=("constant", type(value), repr(value)))
+
+
+def _generate(graph, number_of_inputs, outputs):
+    """Generates the Python source of the kernel and returns the kernel."""
+    roots = list(outputs.values()) if isinstance(outputs, dict) else [outputs]
+    # Count how many times each node is used by the results, nodes that aren't used by the results count 0
+    uses = [0] * len(graph.nodes)
+    for root in roots:
+        uses[root.index] += 1
+    for node in reversed(graph.nodes):
+        if uses[node.index] and node.operation not in ("input", "constant"):
+            for argument in node.arguments:
+                uses[argument.index] += 1
+
+    namespace = {}
+    expressions = {}
+    lines = []
+    for node in graph.nodes:
+        if uses[node.index] == 0:
+            continue  # Computed while tracing but not used by the results
+        if node.operation == "input":
+            expression = f"x{node.arguments[0]}"
+        elif node.operation == "constant":
+            value = node.arguments[1]
+            if isinstance(value, (int, float)) and math.isfinite(value):
+                expression = f"({value!r})"
+            else:
+                expression = f"c{node.index}"
+                namespace[expression] = value
+        else:
+            arguments = [expressions[argument.index] for argument in node.arguments]
+            if node.operation in _BINARY_OPERATORS:
+                expression = f"({arguments[0]} {_BINARY_OPERATORS[node.operation]} {arguments[1]})"
+            elif node.operation in _UNARY_OPERATORS:
+                expression = f"({_UNARY_OPERATORS[node.operation]}{arguments[0]})"
+            else:
+                expression = f"abs({arguments[0]})"
+            # Subexpressions used several times are computed once and stored
+            if uses[node.index] > 1:
+                lines.append(f"    v{node.index} = {expression}")
+                expression = f"v{node.index}"
+        expressions[node.index] = expression
+
+    if isinstance(outputs, dict):
+        keys = list(outputs)
+        namespace["keys"] = keys
+        result = "{" + ", ".join(f"keys[{i}]: {expressions[node.index]}" for i, node in enumerate(roots)) + "}"
+    else:
+        result = expressions[outputs.index]
+    parameters = ", ".join(f"x{i}" for i in range(number_of_inputs))
+    source = "\n".join([f"def kernel({parameters}):", *lines, f"    return {result}", ""])
+
+    exec(compile(source, "<compiled formula>", "exec"), namespace)
+    kernel = namespace["kernel"]
+    kernel.source = source
+    kernel.batch = _make_batch(kernel, _make_to_rows(outputs))
+    return kernel
+
+
+def _make_to_rows(outputs):
+    """Returns a function turning the result columns of a batch into one result per row."""
+    if not isinstance(outputs, dict):
+        return lambda column: column
+    # Building the dicts is the slowest part of a batch, generate the code to build them with literals
+    namespace = {"keys": list(outputs)}
+    columns = ", ".join(f"r{i}" for i in range(len(outputs)))
+    values = ", ".join(f"a{i}" for i in range(len(outputs)))
+    keys = ", ".join(f"k{i}=keys[{i}]" for i in range(len(outputs)))
+    result = ", ".join(f"k{i}: a{i}" for i in range(len(outputs)))
+    source = (f"def to_rows({columns}, {keys}):\n"
+              f"    return [{{{result}}} for {values}{',' if len(outputs) == 1 else ''} in zip({columns})]\n")
+    exec(compile(source, "<compiled formula>", "exec"), namespace)
+    to_rows = namespace["to_rows"]
+    return lambda columns: to_rows(*columns.values())
+
+
+def _make_batch(kernel, to_rows):
+    def batch(rows):
+        """Evaluates the kernel for every row and returns the results in the same order."""
+        rows = rows if isinstance(rows, list) else list(rows)
+        if numpy is None or not rows:
+            return [kernel(*row) for row in rows]
+        values = [list(map(itemgetter(i), rows)) for i in range(len(rows[0]))]
+        if not all(map(_fits_float64, values)):
+            # Missing optional values, values that aren't numbers or integers that floats can't represent
+            return [kernel(*row) for row in rows]
+        columns = [numpy.array(column, numpy.float64) for column in values]
+
+        results = []
+        for start in range(0, len(rows), BATCH_CHUNK_SIZE):
+            end = min(start + BATCH_CHUNK_SIZE, len(rows))
+            try:
+                # Python doesn't raise on underflow (the result is 0) so neither should the batch
+                with numpy.errstate(divide="raise", over="raise", invalid="raise", under="ignore"):
+                    value = kernel(*(column[start:end] for column in columns))
+            except FloatingPointError:
+                results.extend(kernel(*row) for row in rows[start:end])
+                continue
+            if isinstance(value, dict):
+                value = {key: _to_list(column, end - start) for key, column in value.items()}
+            else:
+                value = _to_list(value, end - start)
+            results.extend(to_rows(value))
+        return results
+
+    return batch
+
+
+def _fits_float64(column):
+    """Returns whether the values are all floats or integers that a float represents exactly."""
+    types = set(map(type, column))
+    if types <= {float}:
+        return True
+    return types <= {float, int} and -_MAX_EXACT_INTEGER <= min(column) and max(column) <= _MAX_EXACT_INTEGER
+
+
+def _to_list(column, number_of_rows):
+    if isinstance(column, numpy.ndarray) and column.ndim == 1:
+        return column.tolist()
+    # A result that doesn't depend on the inputs
+    return [column] * number_of_rows
@@ -16,11 +16,19 @@ class DoneCollectingInput(Exception):
     Custom error type raised to indicate that
     we are done collecting the user's input.
     """
-    pass
+
+    def __init__(self, result=None):
+        """
+        :param result: The value to return for the input
+        """
+        super().__init__()
+        self.result = result
 
 
 class Element:
     """Element that can be displayed in the Navigation. Sub-classes include Folder and Formula"""
+    # Elements use __slots__ since packs of formulas can create tens of thousands of them
+    __slots__ = ("name",)
 
     def __init__(self, name):
         """
@@ -28,62 +36,86 @@ class Element:
         """
         self.name = name
 
-    def run(self):
+    def run(self, session):
         """
         Called when the element is selected during navigation
+
+        :param session: The Session the element is running in
         """
         raise NotImplementedError
 
 
 class Formula(Element):
-    _print_result = print
-
-    @staticmethod
-    def override_print_result(printer):
-        Formula._print_result = printer
+    __slots__ = ("func", "inputs", "decimal_places", "table", "call", "exact")
 
-    def __init__(self, func, inputs, name, decimal_places=None):
+    def __init__(self, func, inputs, name, decimal_places=None, table=None, call=None, exact=False):
+        """
+        :param func: The function computing the formula
+        :param inputs: The <Input> elements describing the inputs passed to func
+        :param name: Name to display in the navigation
+        :param decimal_places: Number of decimal places to round the result to before printing it
+        :param table: Optional <LookupTable> used to answer the formula
+        :param call: Function called with the inputs in order that calls func. Defaults to func.
+        :param exact: Whether func supports the exact precision (Fraction inputs, see precision.py)
+        """
         super(Formula, self).__init__(name)
         self.func = func
         self.inputs = inputs
         self.decimal_places = decimal_places
-
-    def run(self):
+        self.call = call if call is not None else func
+        self.table = table
+        self.exact = exact
+        if table is not None:
+            table.bind(self)
+
+    def evaluate(self, *inputs):
+        """Call the formula with already parsed inputs and return its (unrounded) result."""
+        if self.table is not None:
+            return self.table.lookup(inputs)
+        return self.call(*inputs)
+
+    def run(self, session):
         while True:
             inputs = []
 
             # For each required input, read the input and add it the list
             try:
                 for input_description in self.inputs:
-                    inputs.append(input_description.read())
+                    inputs.append(input_description.read(session))
             # If the user fails to enter an input, cancel the formula
             except UserInputError:
                 break
 
-            # Call the formula with the inputs
-            ans = self.func(*inputs)
+            # Call the formula with the inputs (through the session so extensions can hook in)
+            ans = session.evaluate(self, inputs)
 
             # Print the results
             if ans is not None:
                 if self.decimal_places is not None:
                     ans = self.round_result(ans)
 
-                print(f"{self.name}:")
-                Formula._print_result(ans)
+                session.write(f"{self.name}:")
+                session.result_printer(ans)
 
-            selection = input("\nEnter to run again or 0 to return...\n>>> ")
+            session.write("\nEnter to run again or 0 to return...")
+            selection = session.read()
             if selection == "0":
                 break
 
     def round_result(self, result):
-        # Round the result if the result is a float
-        if isinstance(result, float) and not math.isnan(result):
-            result = round(result, ndigits=self.decimal_places)
-
         # Round the result if the result is a dict
-        elif isinstance(result, dict):
+        if isinstance(result, dict):
             for key, val in result.items():
-                if isinstance(val, float) and not math.isnan(val):
-                    result[key] = round(val, self.decimal_places)
-
-        return result
\ No newline at end of file
+                result[key] = self._round(val)
+            return result
+        return self._round(result)
+
+    def _round(self, value):
+        # Round the value if the value is a float
+        if isinstance(value, float):
+            return value if math.isnan(value) else round(value, ndigits=self.decimal_places)
+        if isinstance(value, int):
+            return value
+        # Fraction, Decimal and LogFloat from the log and exact precisions
+        from formula_prompt.precision import round_value
+        return round_value(value, self.decimal_places)
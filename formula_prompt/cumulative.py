@@ -0,0 +1,134 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+cumulative.py derives cumulative distributions from a probability mass function (pmf).
+
+Rather than evaluating the pmf for every term of the sum, each term is found from the
+previous one using the ratio between consecutive terms, pmf(k + 1) / pmf(k). Partial sums
+are cached for every set of parameters so evaluating x + 1 after x only costs one more term.
+
+When the first term underflows to 0 (e.g. 0.5 ** 1500 for a binomial with large n), the terms are
+kept as LogFloat instead, starting from the pmf evaluated in the log precision. This only works for
+pmfs written with the functions of precision.py, otherwise every term is evaluated with the pmf.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+from formula_prompt.precision import FLOAT, LOG, LogFloat, current_mode, precision
+
+
+class _PartialSums:
+    """The partial sums of the pmf for one set of parameters."""
+
+    def __init__(self, first_term, log_term=None):
+        """
+        :param first_term: The pmf at start
+        :param log_term: The pmf at start as a LogFloat if the terms are found in log space
+        """
+        self.sums = [first_term]
+        self.last_term = first_term
+        self.log_term = log_term
+        self.log_total = log_term
+
+
+class CumulativeDistribution:
+    """
+    Callable that evaluates sum(pmf(k, *params) for k in range(start, x + 1)).
+    """
+
+    def __init__(self, pmf, ratio, start=0, cache_size=128):
+        """
+        :param pmf: The probability mass function, called as pmf(k, *params).
+        :param ratio: Function called as ratio(k, *params) that returns pmf(k + 1, *params) / pmf(k, *params).
+        :param start: Smallest k to sum from. Either an integer or a function called as start(*params).
+        :param cache_size: Number of parameter sets for which the partial sums are kept.
+        """
+        self.pmf = pmf
+        self.ratio = ratio
+        self.start = start
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, x, *params):
+        start = self.start(*params) if callable(self.start) else self.start
+        if x < start:
+            return 0.0
+
+        # The sums differ between precisions (e.g. floats and LogFloat) so they are cached separately
+        key = (current_mode(), params)
+        partial_sums = self._cache.get(key)
+        if partial_sums is not None and x - start < len(partial_sums.sums):
+            return partial_sums.sums[x - start]
+
+        # Extending the partial sums is the only part that modifies the cache
+        with self._lock:
+            partial_sums = self._cache.get(key)
+            if partial_sums is None:
+                partial_sums = self._first_term(start, params)
+                self._cache[key] = partial_sums
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+            self._extend(partial_sums, start, x, params)
+        return partial_sums.sums[x - start]
+
+    def _first_term(self, start, params):
+        if current_mode() != FLOAT:
+            return _PartialSums(self.pmf(start, *params))
+        try:
+            term = self.pmf(start, *params)
+        except OverflowError:
+            term = None
+        if term is None or term == 0:
+            log_term = self._log_pmf(start, params)
+            if log_term is not None and log_term:
+                return _PartialSums(float(log_term), log_term)
+            if term is None:
+                term = self.pmf(start, *params)  # Raises the OverflowError
+        return _PartialSums(term)
+
+    def _log_pmf(self, k, params):
+        """Returns the pmf at k as a LogFloat or None if it can't be found."""
+        try:
+            with precision(LOG):
+                value = self.pmf(k, *params)
+            return LogFloat.from_value(value)
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+
+    def _extend(self, partial_sums, start, x, params):
+        if partial_sums.log_term is not None:
+            self._extend_in_log_space(partial_sums, start, x, params)
+            return
+
+        sums = partial_sums.sums
+        term = partial_sums.last_term
+        total = sums[-1]
+        for k in range(start + len(sums), x + 1):
+            # The recurrence gets stuck at 0 (e.g. underflow) so evaluate the pmf directly in that case
+            if term == 0:
+                term = self.pmf(k, *params)
+            else:
+                try:
+                    term *= self.ratio(k - 1, *params)
+                except ZeroDivisionError:
+                    term = self.pmf(k, *params)
+            total += term
+            sums.append(total)
+        partial_sums.last_term = term
+
+    def _extend_in_log_space(self, partial_sums, start, x, params):
+        sums = partial_sums.sums
+        term = partial_sums.log_term
+        total = partial_sums.log_total
+        for k in range(start + len(sums), x + 1):
+            try:
+                term = term * self.ratio(k - 1, *params)
+            except ZeroDivisionError:
+                term = self._log_pmf(k, params) or LogFloat(-math.inf)
+            total = total + term
+            sums.append(float(total))
+        partial_sums.log_term = term
+        partial_sums.log_total = total
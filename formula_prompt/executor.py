@@ -0,0 +1,334 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+executor.py evaluates a formula for many sets of inputs using all the cores of the machine.
+
+Backends:
+
+serial -- Evaluates every row in the current thread.
+
+thread -- Evaluates the rows in a thread pool. Only faster than serial on free-threaded
+builds of Python (or for formulas that release the GIL) but never copies the inputs.
+
+process -- Evaluates the rows in a process pool. Lists of floats (e.g. samples from ListInput) are placed
+once in shared memory and every worker reads them from there instead of receiving a copy. Formulas
+receive them as a SharedSequence, a read-only sequence with the methods of lists that don't modify
+them (len, indexing, iteration, index, count, ...). Formulas that modify their list must copy it
+first (e.g. with x.copy() or list(x)). Other lists (e.g. of integers) are sent to the workers as they are.
+Registered formulas are found by name in the workers, other formulas are pickled
+(so their function must be defined at the top level of a module).
+
+interpreter -- Same as process but uses sub-interpreters (Python 3.14+). The modules defining the
+formulas (and the modules they import) must support sub-interpreters.
+
+auto -- Uses threads on free-threaded builds of Python. Otherwise, evaluates a few rows to estimate how long
+the batch takes and only uses processes if that's long enough to pay for starting them, the processes are
+started with fork (other start methods import the main module again, which must then be guarded by
+if __name__ == '__main__') and the formula can be sent to processes. Serial otherwise.
+"""
+import atexit
+import importlib
+import math
+import operator
+import os
+import pickle
+import sys
+import time
+from array import array
+from itertools import repeat
+
+from formula_prompt.setup import get_formula
+
+BACKENDS = ("auto", "serial", "thread", "process", "interpreter")
+
+# auto only uses processes if evaluating the rows serially is estimated to take longer than this (in seconds)
+_MIN_SECONDS_FOR_PROCESSES = 1.0
+# Number of rows auto evaluates to estimate how long the batch takes
+_SAMPLE_ROWS = 16
+
+
+def evaluate_many(formula, rows, backend="auto", max_workers=None, chunk_size=None):
+    """
+    Evaluates the formula for every row of inputs and returns the results in the same order.
+
+    :param formula: A Formula or the name of a registered formula
+    :param rows: Iterable of tuples of inputs (in the order of the formula's inputs)
+    :param backend: One of BACKENDS (see module documentation)
+    :param max_workers: Number of threads, processes or interpreters. Defaults to the number of cores.
+    :param chunk_size: Number of rows sent to a worker at once. Defaults to splitting the rows evenly
+    in 4 chunks per worker.
+    """
+    if isinstance(formula, str):
+        formula = get_formula(formula)
+    rows = [tuple(row) for row in rows]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Expected one of {BACKENDS}.")
+    reference = None
+    # Results of the rows evaluated by auto to choose the backend
+    sampled = []
+    if backend == "auto":
+        backend, sampled = _default_backend(formula, rows, max_workers)
+        rows = rows[len(sampled):]
+        if backend == "process":
+            try:
+                reference = _formula_reference(formula)
+            except TypeError:
+                backend = "serial"
+
+    if backend == "serial" or not rows:
+        return sampled + _evaluate_rows(formula, rows)
+
+    # Only imported for the parallel backends since they take a while to import
+    import concurrent.futures
+
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(rows) / (max_workers * 4)))
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+
+    if backend == "thread":
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as pool:
+            return sampled + _flatten(pool.map(lambda chunk: _evaluate_rows(formula, chunk), chunks))
+
+    if backend == "interpreter":
+        pool_type = getattr(concurrent.futures, "InterpreterPoolExecutor", None)
+        if pool_type is None:
+            raise ValueError("The interpreter backend requires Python 3.14 or later.")
+    else:
+        pool_type = concurrent.futures.ProcessPoolExecutor
+
+    if reference is None:
+        reference = _formula_reference(formula)
+    shared_chunks, shared_blocks = _share_lists(chunks)
+    try:
+        with pool_type(max_workers) as pool:
+            return sampled + _flatten(pool.map(_evaluate_chunk, repeat(reference), shared_chunks))
+    finally:
+        for block in shared_blocks:
+            block.close()
+            block.unlink()
+
+
+def is_free_threaded():
+    """Returns True if running on a build of Python where threads run in parallel (no GIL)."""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _default_backend(formula, rows, max_workers):
+    """Returns the backend used by auto and the results of the first rows if some were evaluated to choose it."""
+    if max_workers <= 1 or len(rows) <= _SAMPLE_ROWS:
+        return "serial", []
+    if is_free_threaded():
+        return "thread", []
+
+    start = time.perf_counter()
+    sampled = _evaluate_rows(formula, rows[:_SAMPLE_ROWS])
+    estimate = (time.perf_counter() - start) / _SAMPLE_ROWS * (len(rows) - _SAMPLE_ROWS)
+    if estimate < _MIN_SECONDS_FOR_PROCESSES:
+        return "serial", sampled
+
+    import multiprocessing
+    if multiprocessing.get_context().get_start_method() != "fork":
+        return "serial", sampled
+    return "process", sampled
+
+
+def _evaluate_rows(formula, rows):
+    # Compiled formulas (register_formula(..., compile=True)) evaluate all the rows at once
+    batch = getattr(formula.call, "batch", None)
+    if batch is not None and formula.table is None:
+        return batch(rows)
+    return [formula.evaluate(*row) for row in rows]
+
+
+def _formula_reference(formula):
+    """
+    Returns what is sent to the workers to find the formula: (module, name) for registered formulas,
+    otherwise the formula itself.
+
+    :raises TypeError: If the formula isn't registered and can't be pickled
+    """
+    try:
+        if get_formula(formula.name) is formula:
+            return getattr(formula.func, "__module__", None), formula.name
+    except KeyError:
+        pass
+    try:
+        pickle.dumps(formula)
+    except Exception as e:
+        raise TypeError(f"Formula '{formula.name}' isn't registered and can't be sent to other processes ({e}). "
+                        f"Register it or use the serial or thread backend.") from None
+    return formula
+
+
+def _flatten(chunk_results):
+    return [result for chunk in chunk_results for result in chunk]
+
+
+class _SharedList:
+    """Placeholder for a list of floats that was placed in shared memory."""
+    __slots__ = ("name", "length", "is_array")
+
+    def __init__(self, name, length, is_array):
+        self.name = name
+        self.length = length
+        self.is_array = is_array
+
+
+def _share_lists(chunks):
+    """
+    Replaces every list of floats in the rows by a _SharedList. Lists used in several rows are only shared once.
+    Returns the new chunks and the shared memory blocks (which must be unlinked once done).
+    """
+    shared = {}  # id of the list -> _SharedList
+    blocks = []
+    new_chunks = []
+    try:
+        for chunk in chunks:
+            new_chunk = []
+            for row in chunk:
+                new_row = []
+                for value in row:
+                    if isinstance(value, (list, array)):
+                        placeholder = shared.get(id(value))
+                        if placeholder is None:
+                            placeholder = _create_shared_list(value, blocks)
+                            shared[id(value)] = placeholder
+                        if placeholder is not False:
+                            value = placeholder
+                    new_row.append(value)
+                new_chunk.append(tuple(new_row))
+            new_chunks.append(new_chunk)
+    except BaseException:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+    return new_chunks, blocks
+
+
+def _create_shared_list(values, blocks):
+    from multiprocessing import shared_memory
+
+    # Only floats survive the trip through an array of doubles unchanged (integers above 2 ** 53 wouldn't)
+    is_array = isinstance(values, array)
+    if is_array and values.typecode != "d" or not is_array and not all(type(value) is float for value in values):
+        return False  # It will be sent as is
+    block = shared_memory.SharedMemory(create=True, size=max(1, 8 * len(values)))
+    blocks.append(block)
+    if values:
+        view = block.buf.cast("d")
+        view[:len(values)] = values if is_array else array("d", values)
+        view.release()
+    return _SharedList(block.name, len(values), is_array)
+
+
+class SharedSequence:
+    """
+    Read-only sequence of floats in shared memory given to formulas by the process backend instead of a list.
+    Supports the methods of lists that don't modify them. Slicing and copy() return a list
+    (or an array if an array was given to evaluate_many).
+    """
+    __slots__ = ("_values", "_is_array")
+
+    def __init__(self, values, is_array=False):
+        """
+        :param values: A memoryview of doubles
+        :param is_array: Whether copies are arrays instead of lists
+        """
+        self._values = values
+        self._is_array = is_array
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._copy(self._values[index])
+        return self._values[index]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __reversed__(self):
+        return iter(self._values[::-1])
+
+    def __contains__(self, value):
+        return value in self._values
+
+    def index(self, value, start=0, stop=sys.maxsize):
+        start, stop, _ = slice(start, stop).indices(len(self._values))
+        try:
+            return start + operator.indexOf(self._values[start:stop], value)
+        except ValueError:
+            raise ValueError(f"{value!r} is not in list") from None
+
+    def count(self, value):
+        return operator.countOf(self._values, value)
+
+    def copy(self):
+        return self._copy(self._values)
+
+    def _copy(self, values):
+        return array("d", values) if self._is_array else values.tolist()
+
+    def __eq__(self, other):
+        if isinstance(other, (SharedSequence, list, array)):
+            return len(self) == len(other) and all(map(operator.eq, self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Results returned to the main process are sent as copies
+        return (array, ("d", self._values.tolist())) if self._is_array else (list, (self._values.tolist(),))
+
+    def __repr__(self):
+        return f"SharedSequence({self._values.tolist()!r})"
+
+
+# Blocks of shared memory attached by this worker and the sequences reading them, by name of the block
+_ATTACHED = {}
+
+
+def _attach(shared_list):
+    """Returns a SharedSequence reading a list in shared memory (called in the workers, attached once per worker)."""
+    attached = _ATTACHED.get(shared_list.name)
+    if attached is None:
+        from multiprocessing import shared_memory
+        if not _ATTACHED:
+            atexit.register(_detach_all)
+        block = shared_memory.SharedMemory(name=shared_list.name)
+        values = block.buf[:8 * shared_list.length].cast("d")
+        # Rows sharing a list in the main process also share it in the worker, like with the serial backend
+        attached = _ATTACHED[shared_list.name] = (block, SharedSequence(values, shared_list.is_array))
+    return attached[1]
+
+
+def _detach_all():
+    """Closes the blocks attached by this worker (the views must be released first)."""
+    for block, sequence in _ATTACHED.values():
+        sequence._values.release()
+        block.close()
+    _ATTACHED.clear()
+
+
+def _evaluate_chunk(reference, rows):
+    """Evaluates a chunk of rows (called in the workers)."""
+    if isinstance(reference, tuple):
+        module, formula_name = reference
+        try:
+            formula = get_formula(formula_name)
+        except KeyError:
+            # The module that registers the formula wasn't imported in this worker yet
+            if module is None or module == "__main__":
+                raise
+            importlib.import_module(module)
+            formula = get_formula(formula_name)
+    else:
+        formula = reference
+
+    return _evaluate_rows(formula, [[_attach(value) if isinstance(value, _SharedList) else value for value in row]
+                                    for row in rows])
@@ -1,2 +1,40 @@
 #  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+Extensions add features to a Session (e.g. memory variables).
 
+An extension subclasses Extension and overrides the hooks it needs. Only the hooks an extension
+overrides are called. Hooks run in the order the extensions were added to the session.
+
+preprocess() -- Called with a line entered by the user before it's passed to an input. Only called for
+inputs that are instances of input_types and for lines that fully match pattern. The first extension
+returning something other than None provides the value of the input, the next ones aren't called.
+
+before_formula() -- Called with the inputs before a formula is evaluated. Can return new inputs.
+
+after_formula() -- Called with the result of a formula. Can return a new result.
+"""
+
+
+class Extension:
+    # Name of the extension, an extension is only added once per session
+    name = None
+    # Types of the inputs whose lines are passed to preprocess(). None for all inputs.
+    input_types = None
+    # Regular expression that a line must fully match to be passed to preprocess(). None for all lines.
+    pattern = None
+
+    def register(self, session):
+        """Called once when the extension is added to the session (e.g. to add persistent children)."""
+        pass
+
+    def preprocess(self, session, line):
+        """Returns the value of the input for the line or None to let the input parse the line."""
+        return None
+
+    def before_formula(self, session, formula, inputs):
+        """Returns new inputs for the formula or None to keep the inputs."""
+        return None
+
+    def after_formula(self, session, formula, inputs, result):
+        """Returns a new result for the formula or None to keep the result."""
+        return None
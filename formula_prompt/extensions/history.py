@@ -0,0 +1,52 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+Extension that records every formula evaluated in the prompt in a History
+and adds the option to look through it.
+"""
+import threading
+import time
+
+from formula_prompt.core import *
+from formula_prompt.extensions import Extension
+from formula_prompt.history import History
+
+# Number of evaluations printed by the History option
+_NUMBER_TO_SHOW = 20
+
+
+class _ShowHistory(Element):
+    __slots__ = ("history",)
+
+    def __init__(self, history):
+        super().__init__("History")
+        self.history = history
+
+    def run(self, session):
+        session.write("Enter formula name or leave empty for all formulas")
+        name = session.read()
+        evaluations = self.history.query(name=name or None, limit=_NUMBER_TO_SHOW)
+        if not evaluations:
+            session.write("No evaluations")
+        for evaluation in evaluations:
+            session.write(evaluation)
+
+
+class HistoryExtension(Extension):
+    name = "history"
+
+    def __init__(self, history=None):
+        """
+        :param history: The History to record the evaluations in. Defaults to a new History kept in memory.
+        """
+        self.history = history if history is not None else History()
+        # Start of the evaluation, per thread since sessions sharing the extension can run in parallel threads
+        self._local = threading.local()
+
+    def register(self, session):
+        session.add_persistent_child(_ShowHistory(self.history))
+
+    def before_formula(self, session, formula, inputs):
+        self._local.start = time.perf_counter()
+
+    def after_formula(self, session, formula, inputs, result):
+        self.history.add(formula.name, inputs, result, time.perf_counter() - self._local.start)
@@ -2,56 +2,297 @@
 """
 Extension that adds the option to save an input
 to a variable and then use it in other formulas
+
+Variables can also hold the result of a formula whose inputs refer to other variables.
+Like in a spreadsheet, updating a variable marks the results computed from it as stale
+and they are recomputed the next time they're read. If the formula fails, the variable (and the
+variables computed from it) are unavailable until one of their inputs changes.
 """
-from formula_prompt.inputs import ALL_INPUT_TYPES, Input
+from formula_prompt.extensions import Extension
+from formula_prompt.inputs import ALL_INPUT_TYPES
 from formula_prompt.navigation import Folder
 from formula_prompt.core import *
 from typing import List
 
-MEMORY = {}
+
+class Ref:
+    """Refers to a memory variable in the inputs of a formula stored in memory."""
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Ref({self.name!r})"
+
+
+class FormulaFailed:
+    """Held by a variable whose formula failed when it was last computed."""
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+    def __repr__(self):
+        return f"<unavailable, {type(self.error).__name__}: {self.error}>"
+
+
+class Memory:
+    """
+    The variables of a session. Variables either hold a value or the result of a formula.
+    """
+
+    def __init__(self):
+        self._values = {}
+        # Variables holding a formula result -> (formula, inputs where Ref are other variables)
+        self._formulas = {}
+        # Variable -> variables whose formulas use it
+        self._dependents = {}
+        # Variables holding a formula result that must be recomputed before being read
+        self._stale = set()
+
+    def get(self, name, default=None):
+        """
+        Returns the value of the variable (recomputing it if needed) or default
+        if it doesn't exist or its formula failed.
+        """
+        value = self._value(name, default)
+        return default if isinstance(value, FormulaFailed) else value
+
+    def error(self, name):
+        """Returns the exception raised by the formula of the variable or None if the variable is available."""
+        value = self._value(name)
+        return value.error if isinstance(value, FormulaFailed) else None
+
+    def set(self, name, value):
+        """Sets the variable to a value. Results computed from the variable will be recomputed when read."""
+        self._remove_formula(name)
+        self._values[name] = value
+        self._invalidate(name)
+
+    def set_formula(self, name, formula, inputs):
+        """
+        Sets the variable to the result of the formula. Inputs can be values or Ref to other variables.
+        The result is recomputed when it is read after one of the referenced variables changed.
+        """
+        references = [value.name for value in inputs if isinstance(value, Ref)]
+        for reference in references:
+            if reference not in self._values:
+                raise KeyError(f"No variable named '{reference}'")
+            if reference == name or name in self._upstream(reference):
+                raise ValueError(f"Variable '{name}' can't depend on itself")
+
+        self._remove_formula(name)
+        self._formulas[name] = (formula, tuple(inputs))
+        for reference in references:
+            self._dependents.setdefault(reference, set()).add(name)
+        self._values.setdefault(name, None)
+        self._invalidate(name)
+        self._stale.add(name)
+
+    def items(self):
+        """Returns (name, value) for every variable, the value is a FormulaFailed if the formula failed."""
+        return [(name, self._value(name)) for name in self._values]
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            raise KeyError(name)
+        value = self._value(name)
+        if isinstance(value, FormulaFailed):
+            raise KeyError(f"Variable '{name}' is unavailable: {value.error}")
+        return value
+
+    def __setitem__(self, name, value):
+        self.set(name, value)
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def __iter__(self):
+        return iter(list(self._values))
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        return dict(self.items()) == (dict(other.items()) if isinstance(other, Memory) else other)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def _value(self, name, default=None):
+        if name in self._stale:
+            self._compute(name)
+        return self._values.get(name, default)
+
+    def _compute(self, name):
+        formula, inputs = self._formulas[name]
+        # The result is kept until an input changes, even if the formula failed
+        self._stale.discard(name)
+        values = []
+        for value in inputs:
+            if isinstance(value, Ref):
+                value = self._value(value.name)
+                if isinstance(value, FormulaFailed):
+                    self._values[name] = value
+                    return
+            values.append(value)
+        try:
+            self._values[name] = formula.evaluate(*values)
+        except (ArithmeticError, ValueError, TypeError, UserInputError) as e:
+            self._values[name] = FormulaFailed(e)
+
+    def _invalidate(self, name):
+        """Marks every variable computed (directly or not) from name as stale."""
+        to_visit = list(self._dependents.get(name, ()))
+        while to_visit:
+            dependent = to_visit.pop()
+            if dependent not in self._stale:
+                self._stale.add(dependent)
+                to_visit.extend(self._dependents.get(dependent, ()))
+
+    def _upstream(self, name):
+        """Returns every variable that name is computed from (directly or not)."""
+        upstream = set()
+        to_visit = [name]
+        while to_visit:
+            formula = self._formulas.get(to_visit.pop())
+            if formula is None:
+                continue
+            for value in formula[1]:
+                if isinstance(value, Ref) and value.name not in upstream:
+                    upstream.add(value.name)
+                    to_visit.append(value.name)
+        return upstream
+
+    def _remove_formula(self, name):
+        formula = self._formulas.pop(name, None)
+        self._stale.discard(name)
+        if formula is None:
+            return
+        for value in formula[1]:
+            if isinstance(value, Ref):
+                self._dependents.get(value.name, set()).discard(name)
 
 
 class _AddToMemoryFolder(Folder):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("Add to Memory")
 
         for input_type in ALL_INPUT_TYPES:
-            self.children.add(_AddToMemory(input_type))
+            self.add_child(_AddToMemory(input_type))
+        self.add_child(_AddFormulaToMemory())
 
-    def get_children(self) -> List[Element]:
+    def get_children(self, session) -> List[Element]:
         return [self.leave_folder_child] + list(self.children)
 
 
+def _read_variable_name(session):
+    """Asks the user for a variable name. Returns None if the user fails to enter a valid name."""
+    for _ in range(MAX_ENTRY_ATTEMPTS):
+        session.write("Enter variable name")
+        var_name = session.read()
+        if var_name == "" or not var_name.isalpha():
+            session.write("Invalid input")
+            continue
+        return var_name
+    return None
+
+
 class _AddToMemory(Element):
+    __slots__ = ("input",)
+
     def __init__(self, input_type):
         self.input = input_type()
         super().__init__(input_type.__name__)
 
-    def run(self):
-        for _ in range(MAX_ENTRY_ATTEMPTS):
-            print("Enter variable name")
-            var_name = input(">>> ")
-            if var_name == "" or not var_name.isalpha():
-                print("Invalid input")
-                continue
+    def run(self, session):
+        var_name = _read_variable_name(session)
+        if var_name is not None:
+            session.memory[var_name] = self.input.read(session)
+        return True  # Return true to indicate we should leave parent folder
 
-            MEMORY[var_name] = self.input.read()
-            return True  # Return true to indicate we should leave parent folder
+
+class _AddFormulaToMemory(Element):
+    """Saves the result of a formula whose inputs can refer to other variables."""
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__("Formula result")
+
+    def run(self, session):
+        from formula_prompt.setup import get_formula
+
+        var_name = _read_variable_name(session)
+        if var_name is None:
+            return True
+
+        session.write("Enter formula name")
+        try:
+            formula = get_formula(session.read())
+        except KeyError as e:
+            session.write(e.args[0])
+            return True
+
+        try:
+            inputs = [self._read_input(session, input_description) for input_description in formula.inputs]
+            session.memory.set_formula(var_name, formula, inputs)
+        except (UserInputError, ValueError) as e:
+            if e.args:
+                session.write(e.args[0])
+            return True
+
+        error = session.memory.error(var_name)
+        if error is not None:
+            session.write(f"Formula failed, {var_name} is unavailable: {error}")
+            return True
+        session.write(f"{var_name}:")
+        session.result_printer(session.memory.get(var_name))
+        return True
+
+    @staticmethod
+    def _read_input(session, input_description):
+        session.write(f"Input {input_description.name} (value or variable name):")
+        for _ in range(MAX_ENTRY_ATTEMPTS):
+            line = session.read()
+            if line in session.memory:
+                return Ref(line)
+            if input_description.optional and line == "":
+                return None
+            try:
+                return input_description.parse(line)
+            except ValueError as e:
+                session.write(e)
+        raise UserInputError
 
 
 class _ReadFromMemory(Element):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("Read from memory")
 
-    def run(self):
-        print(MEMORY)
+    def run(self, session):
+        session.write(session.memory)
+
+
+class MemoryExtension(Extension):
+    name = "memory"
+    # Variable names are made of letters only (see _read_variable_name), other lines can't be variables
+    pattern = r"[^\W\d_]+"
 
+    def register(self, session):
+        session.add_persistent_child(_AddToMemoryFolder())
+        session.add_persistent_child(_ReadFromMemory())
 
-def get_from_memory(key):
-    return MEMORY.get(key, None)
+    def preprocess(self, session, line):
+        error = session.memory.error(line)
+        if error is not None:
+            session.write(f"Variable {line} is unavailable: {error}")
+        return session.memory.get(line)
 
 
-def register_memory_extension():
-    Input.add_preprocess(get_from_memory)
-    Folder.add_persistent_child(_AddToMemoryFolder())
-    Folder.add_persistent_child(_ReadFromMemory())
+def register_memory_extension(session):
+    session.add_extension(MemoryExtension())
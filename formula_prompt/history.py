@@ -0,0 +1,251 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+history.py keeps a log of the formulas evaluated: name, inputs, result, duration and time.
+
+The log is append-only and indexed by formula name, by time and by inputs, so past results can be
+found (and reused) without scanning the whole log. The oldest evaluations are dropped once the log
+holds max_entries evaluations or once they are older than max_age.
+
+If a path is given, every evaluation is also appended to that file (one JSON object per line) and the
+file is read back when the History is created. The file is rewritten without the dropped evaluations
+when it holds twice as many lines as the History.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+DEFAULT_MAX_ENTRIES = 10_000
+
+
+class Evaluation:
+    """One evaluation of a formula."""
+    __slots__ = ("sequence", "name", "inputs", "result", "duration", "timestamp")
+
+    def __init__(self, sequence, name, inputs, result, duration, timestamp):
+        """
+        :param sequence: Position of the evaluation in the history (counting the dropped evaluations)
+        :param name: Name of the formula
+        :param inputs: Tuple of the inputs
+        :param result: The result of the formula (before rounding)
+        :param duration: Time the evaluation took in seconds
+        :param timestamp: When the evaluation happened (seconds since the epoch, like time.time())
+        """
+        self.sequence = sequence
+        self.name = name
+        self.inputs = inputs
+        self.result = result
+        self.duration = duration
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        inputs = ", ".join(map(repr, self.inputs))
+        moment = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.timestamp))
+        return f"{moment} {self.name}({inputs}) = {self.result!r} [{self.duration * 1000:.3f} ms]"
+
+
+class History:
+    """
+    Log of the evaluations of formulas, see module documentation.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_age=None, path=None):
+        """
+        :param max_entries: Maximum number of evaluations kept
+        :param max_age: Evaluations older than this number of seconds are dropped. Kept forever if None.
+        :param path: Optional file where the evaluations are saved
+        """
+        if max_entries < 1:
+            raise ValueError("The history must keep at least one evaluation")
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.path = path
+        # Evaluations in the order they were added. The dropped ones are before _start and
+        # removed from the list once they make up half of it.
+        self._entries = []
+        self._timestamps = []
+        self._start = 0
+        self._next_sequence = 0
+        # Formula name -> evaluations of that formula in order (can start with dropped evaluations)
+        self._by_name = {}
+        # (formula name, inputs) -> last evaluation of the formula with those inputs
+        self._by_inputs = {}
+        self._lines_in_file = 0
+        # The history can be shared by sessions running in different threads
+        self._lock = threading.RLock()
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def add(self, name, inputs, result, duration, timestamp=None):
+        """Adds an evaluation to the history and returns it."""
+        with self._lock:
+            if timestamp is None:
+                timestamp = time.time()
+            # Keep the timestamps in order even if the clock goes back
+            if self._timestamps and timestamp < self._timestamps[-1]:
+                timestamp = self._timestamps[-1]
+            if isinstance(result, dict):
+                result = dict(result)  # The prompt rounds dict results in place
+            evaluation = Evaluation(self._next_sequence, name, tuple(inputs), result, duration, timestamp)
+            self._append(evaluation)
+            if self.path is not None:
+                self._write(evaluation)
+            return evaluation
+
+    def query(self, name=None, since=None, until=None, limit=None):
+        """
+        Returns the evaluations (oldest first), optionally only those of one formula and between two times.
+
+        :param name: Only return the evaluations of this formula
+        :param since: Only return the evaluations at or after this time (seconds since the epoch)
+        :param until: Only return the evaluations before this time
+        :param limit: Only return the last limit evaluations
+        """
+        with self._lock:
+            self._drop_old()
+            if name is None:
+                entries, timestamps, first = self._entries, self._timestamps, self._start
+            else:
+                entries = self._by_name.get(name, [])
+                timestamps = None
+                first = self._first_live(entries)
+
+            low = first if since is None else self._search(entries, timestamps, since, first)
+            high = len(entries) if until is None else self._search(entries, timestamps, until, first)
+            if limit is not None:
+                low = max(low, high - limit)
+            return entries[low:high]
+
+    def lookup(self, name, inputs):
+        """Returns the last evaluation of the formula with the same inputs or None."""
+        with self._lock:
+            self._drop_old()
+            try:
+                return self._by_inputs.get((name, tuple(inputs)))
+            except TypeError:  # Inputs that can't be hashed (e.g. lists)
+                return None
+
+    def names(self):
+        """Returns the names of the formulas in the history."""
+        with self._lock:
+            return [name for name, entries in self._by_name.items() if self._first_live(entries) < len(entries)]
+
+    def __len__(self):
+        return len(self._entries) - self._start
+
+    def __iter__(self):
+        return iter(self.query())
+
+    def _append(self, evaluation):
+        self._next_sequence = evaluation.sequence + 1
+        self._entries.append(evaluation)
+        self._timestamps.append(evaluation.timestamp)
+        self._by_name.setdefault(evaluation.name, []).append(evaluation)
+        try:
+            self._by_inputs[(evaluation.name, evaluation.inputs)] = evaluation
+        except TypeError:
+            pass
+        if len(self) > self.max_entries:
+            self._drop(self._start + len(self) - self.max_entries)
+        self._drop_old(evaluation.timestamp)
+
+    def _drop_old(self, now=None):
+        if self.max_age is None:
+            return
+        now = time.time() if now is None else now
+        self._drop(bisect.bisect_left(self._timestamps, now - self.max_age, self._start))
+
+    def _drop(self, end):
+        """Drops the evaluations before index end of _entries."""
+        if end <= self._start:
+            return
+        for evaluation in self._entries[self._start:end]:
+            key = (evaluation.name, evaluation.inputs)
+            try:
+                if self._by_inputs.get(key) is evaluation:
+                    del self._by_inputs[key]
+            except TypeError:
+                pass
+        self._start = end
+
+        # Remove the dropped evaluations once they're half of the list (so removing is amortized constant time)
+        if self._start > len(self._entries) // 2:
+            del self._entries[:self._start]
+            del self._timestamps[:self._start]
+            self._start = 0
+            first_sequence = self._entries[0].sequence if self._entries else self._next_sequence
+            for name in list(self._by_name):
+                entries = self._by_name[name]
+                del entries[:self._first_live(entries, first_sequence)]
+                if not entries:
+                    del self._by_name[name]
+
+    def _first_live(self, entries, first_sequence=None):
+        """Index of the first evaluation in entries that wasn't dropped."""
+        if first_sequence is None:
+            first_sequence = self._entries[self._start].sequence if len(self) else self._next_sequence
+        low, high = 0, len(entries)
+        while low < high:
+            middle = (low + high) // 2
+            if entries[middle].sequence < first_sequence:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def _search(entries, timestamps, moment, low):
+        """Index of the first evaluation at or after moment (entries are in time order)."""
+        if timestamps is not None:
+            return bisect.bisect_left(timestamps, moment, low)
+        high = len(entries)
+        while low < high:
+            middle = (low + high) // 2
+            if entries[middle].timestamp < moment:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _write(self, evaluation):
+        if self._lines_in_file >= 2 * self.max_entries:
+            self._rewrite()  # Also writes the evaluation
+            return
+        with open(self.path, "a") as file:
+            file.write(_to_line(evaluation))
+        self._lines_in_file += 1
+
+    def _rewrite(self):
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as file:
+            file.writelines(_to_line(evaluation) for evaluation in self.query())
+        os.replace(temporary_path, self.path)
+        self._lines_in_file = len(self)
+
+    def _load(self):
+        damaged = False
+        with open(self.path) as file:
+            for line in file:
+                self._lines_in_file += 1
+                try:
+                    data = json.loads(line)
+                    evaluation = Evaluation(self._next_sequence, data["n"], tuple(data["i"]), data["r"],
+                                            data["d"], data["t"])
+                except (ValueError, KeyError, TypeError):
+                    damaged = True  # Line cut short (e.g. the program was stopped while writing)
+                    continue
+                if self._timestamps and evaluation.timestamp < self._timestamps[-1]:
+                    evaluation.timestamp = self._timestamps[-1]
+                self._append(evaluation)
+        # Remove the damaged lines so the next evaluations aren't appended to them
+        if damaged:
+            self._rewrite()
+
+
+def _to_line(evaluation):
+    # Results that JSON doesn't support (e.g. Fraction) are saved as text
+    return json.dumps({"n": evaluation.name, "i": evaluation.inputs, "r": evaluation.result,
+                       "d": evaluation.duration, "t": evaluation.timestamp}, default=str,
+                      separators=(",", ":")) + "\n"
+
@@ -0,0 +1,306 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+ingest.py evaluates a formula for every row of a CSV or Parquet file.
+
+The columns of the file are matched to the formula's inputs by name, ignoring case and
+punctuation (e.g. NumInput("Present value") reads the column 'present_value').
+The file is read and written in chunks so files larger than the memory can be processed.
+The output file contains the columns of the source file followed by the result columns
+(one per key if the formula returns a dict) and an 'error' column describing invalid rows.
+Invalid rows don't stop the evaluation, they are listed in the returned ErrorReport.
+The result columns are found from the first valid result (chunks before it are kept until then)
+unless they're given. If no row has a result after MAX_PENDING_ROWS rows, the kept chunks are written
+with a single 'result' column. Results that don't match the columns are reported as errors.
+
+Reading and writing Parquet files requires pyarrow.
+"""
+import csv
+import os
+import re
+
+from formula_prompt.core import UserInputError
+from formula_prompt.executor import evaluate_many
+from formula_prompt.setup import get_formula
+from formula_prompt.validation import ErrorReport, validate_column, MESSAGES, VALID, FORMULA_ERROR, BAD_RESULT, \
+    NO_INPUT
+
+DEFAULT_CHUNK_SIZE = 10_000
+ERROR_COLUMN = "error"
+RESULT_COLUMN = "result"
+# Number of rows kept in memory while waiting for a result to find the result columns
+MAX_PENDING_ROWS = 100_000
+
+
+def column_name(input_name):
+    """Returns the column name matching an input name, e.g. 'Present value' -> 'present_value'."""
+    return re.sub(r"[^0-9a-z]+", "_", input_name.lower()).strip("_")
+
+
+def evaluate_file(formula, source, destination, columns=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                  backend="serial", max_workers=None, result_keys=None):
+    """
+    Evaluates the formula for every row of the source file and writes the rows with their results to destination.
+
+    :param formula: A Formula or the name of a registered formula
+    :param source: Path to a .csv or .parquet file
+    :param destination: Path to the .csv or .parquet file to write
+    :param columns: Optional dict of input name to column name for columns that don't match the input names
+    :param chunk_size: Number of rows read, evaluated and written at once
+    :param backend: Backend used to evaluate each chunk (see executor.py)
+    :param max_workers: Number of workers used by the backend
+    :param result_keys: The keys of the dicts returned by the formula, used as result columns.
+    Defaults to the keys of the first result (or a single 'result' column if it isn't a dict
+    or if none of the first MAX_PENDING_ROWS rows have a result).
+    :return: An ErrorReport listing the invalid rows
+    """
+    if isinstance(formula, str):
+        formula = get_formula(formula)
+    columns = columns if columns is not None else {}
+
+    report = ErrorReport(input_description.name for input_description in formula.inputs)
+    reader = _open_reader(source, chunk_size)
+    writer = None
+    result_columns = [str(key) for key in result_keys] if result_keys is not None else None
+    # Chunks evaluated before the result columns are known
+    pending = []
+    pending_rows = 0
+    try:
+        indexes = _input_columns(formula, reader.header, columns)
+        for chunk in reader:
+            values, errors = _parse_columns(formula, indexes, chunk, report)
+            results = _evaluate(formula, values, errors, backend, max_workers, report)
+            first_row = report.number_of_rows
+            report.number_of_rows += len(chunk)
+
+            if result_columns is None:
+                result_columns = _result_columns(results)
+                if result_columns is None:
+                    if pending_rows + len(chunk) < MAX_PENDING_ROWS:
+                        pending.append((first_row, chunk, results, errors))
+                        pending_rows += len(chunk)
+                        continue
+                    result_columns = [RESULT_COLUMN]
+            if writer is None:
+                writer = _open_writer(destination, reader, result_columns)
+            for first_row, chunk, results, errors in pending + [(first_row, chunk, results, errors)]:
+                _check_results(results, errors, result_columns, first_row, report)
+                writer.write(chunk, results, errors)
+            pending = []
+
+        if writer is None:
+            writer = _open_writer(destination, reader, result_columns or [RESULT_COLUMN])
+            for first_row, chunk, results, errors in pending:
+                writer.write(chunk, results, errors)
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.close()
+    return report
+
+
+def _input_columns(formula, header, columns):
+    """Returns the index of the column for each of the formula's inputs."""
+    normalized = {column_name(str(name)): i for i, name in enumerate(header)}
+    indexes = []
+    for input_description in formula.inputs:
+        name = columns.get(input_description.name, column_name(input_description.name))
+        if name in header:
+            indexes.append(header.index(name))
+        elif column_name(name) in normalized:
+            indexes.append(normalized[column_name(name)])
+        elif input_description.optional:
+            indexes.append(None)
+        else:
+            raise ValueError(f"No column '{name}' for input '{input_description.name}' of formula '{formula.name}'")
+    return indexes
+
+
+def _parse_columns(formula, indexes, chunk, report):
+    """
+    Checks the chunk one column at a time. Returns the parsed rows and a list with,
+    for each row, None or a message describing why the row is invalid.
+    """
+    errors = [None] * len(chunk)
+    parsed_columns = []
+    for input_index, (input_description, index) in enumerate(zip(formula.inputs, indexes)):
+        if index is None:
+            column = [None] * len(chunk)
+        else:
+            column = [row[index] if index < len(row) else None for row in chunk]
+        parsed, codes = validate_column(input_description, column)
+        report.add_column(report.number_of_rows, input_index, codes)
+        if any(codes):
+            for row_number, code in enumerate(codes):
+                if code != VALID and errors[row_number] is None:
+                    errors[row_number] = f"{input_description.name}: {MESSAGES[code]}"
+        parsed_columns.append(parsed)
+    return list(zip(*parsed_columns)) if parsed_columns else [()] * len(chunk), errors
+
+
+def _evaluate(formula, rows, errors, backend, max_workers, report):
+    """Evaluates the valid rows. Rows for which the formula fails get an error instead of a result."""
+    valid = [i for i, error in enumerate(errors) if error is None]
+    results = [None] * len(rows)
+    try:
+        valid_results = evaluate_many(formula, [rows[i] for i in valid], backend, max_workers)
+    except (ArithmeticError, ValueError, TypeError, UserInputError):
+        # Find which rows fail by evaluating them one at a time
+        valid_results = []
+        for i in valid:
+            try:
+                valid_results.append(formula.evaluate(*rows[i]))
+            except (ArithmeticError, ValueError, TypeError, UserInputError) as e:
+                errors[i] = f"{type(e).__name__}: {e}"
+                report.add(report.number_of_rows + i, NO_INPUT, FORMULA_ERROR)
+                valid_results.append(None)
+    for i, result in zip(valid, valid_results):
+        results[i] = result
+    return results
+
+
+def _result_columns(results):
+    """Returns the result columns matching the first result or None if there are no results."""
+    for result in results:
+        if isinstance(result, dict):
+            return [str(key) for key in result]
+        if result is not None:
+            return [RESULT_COLUMN]
+    return None
+
+
+def _check_results(results, errors, result_columns, first_row, report):
+    """Replaces the results that don't match the result columns by an error."""
+    keys = set(result_columns) if result_columns != [RESULT_COLUMN] else None
+    for i, result in enumerate(results):
+        if result is None:
+            continue
+        if isinstance(result, dict) and keys is not None and {str(key) for key in result} == keys \
+                or not isinstance(result, dict) and keys is None:
+            continue
+        results[i] = None
+        errors[i] = f"{MESSAGES[BAD_RESULT]} ({', '.join(result_columns)}): {result!r}"
+        report.add(first_row + i, NO_INPUT, BAD_RESULT)
+
+
+def _result_values(result, result_columns):
+    if isinstance(result, dict):
+        return [result.get(key) for key in result_columns]
+    if result_columns == [RESULT_COLUMN]:
+        return [result]
+    return [None] * len(result_columns)
+
+
+def _is_parquet(path):
+    return os.fspath(path).lower().endswith((".parquet", ".pq"))
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Reading or writing Parquet files requires pyarrow (pip install pyarrow)") from None
+    return pyarrow
+
+
+def _open_reader(path, chunk_size):
+    return _ParquetReader(path, chunk_size) if _is_parquet(path) else _CsvReader(path, chunk_size)
+
+
+def _open_writer(path, reader, result_columns):
+    if _is_parquet(path):
+        return _ParquetWriter(path, reader, result_columns)
+    return _CsvWriter(path, reader.header, result_columns)
+
+
+class _CsvReader:
+    """Iterates over the chunks of rows of a CSV file."""
+
+    def __init__(self, path, chunk_size):
+        self.file = open(path, newline="")
+        self.rows = csv.reader(self.file)
+        self.header = next(self.rows, [])
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        chunk = []
+        for row in self.rows:
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+class _CsvWriter:
+    def __init__(self, path, header, result_columns):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.result_columns = result_columns
+        self.writer.writerow(list(header) + result_columns + [ERROR_COLUMN])
+
+    def write(self, chunk, results, errors):
+        self.writer.writerows(
+            list(row) + _result_values(result, self.result_columns) + [error if error is not None else ""]
+            for row, result, error in zip(chunk, results, errors))
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetReader:
+    """Iterates over the chunks of rows of a Parquet file, reading one batch of rows at a time."""
+
+    def __init__(self, path, chunk_size):
+        pyarrow = _import_pyarrow()
+        self.file = pyarrow.parquet.ParquetFile(path)
+        self.schema = self.file.schema_arrow
+        self.header = self.schema.names
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for batch in self.file.iter_batches(batch_size=self.chunk_size):
+            yield list(zip(*(column.to_pylist() for column in batch.columns)))
+
+    def close(self):
+        close = getattr(self.file, "close", None)
+        if close is not None:
+            close()
+
+
+class _ParquetWriter:
+    def __init__(self, path, reader, result_columns):
+        self.pyarrow = _import_pyarrow()
+        self.result_columns = result_columns
+        # Keep the types of the source columns, results are numbers (or inferred from the first chunk otherwise)
+        self.source_schema = getattr(reader, "schema", None)
+        self.path = path
+        self.header = list(reader.header)
+        self.writer = None
+
+    def write(self, chunk, results, errors):
+        pyarrow = self.pyarrow
+        arrays = [pyarrow.array([row[i] for row in chunk],
+                                type=self.source_schema.field(i).type if self.source_schema is not None else None)
+                  for i in range(len(self.header))]
+        result_rows = [_result_values(result, self.result_columns) for result in results]
+        for i in range(len(self.result_columns)):
+            column = [row[i] for row in result_rows]
+            try:
+                arrays.append(pyarrow.array(column, type=pyarrow.float64()))
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                arrays.append(pyarrow.array(column))
+        arrays.append(pyarrow.array(errors, type=pyarrow.string()))
+
+        table = pyarrow.table(arrays, names=self.header + self.result_columns + [ERROR_COLUMN])
+        if self.writer is None:
+            self.writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
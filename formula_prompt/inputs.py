@@ -1,24 +1,24 @@
+import math
+import re
+
 from formula_prompt.core import *
+from formula_prompt.validation import VALID, MISSING, BAD_NUMBER, TOO_SMALL, TOO_BIG, INVALID_PERCENT, MESSAGES, \
+    is_float, to_float, to_int, check_column
+
+# Messages printed when the user should enter a value again
+_RETRY_MESSAGES = {
+    BAD_NUMBER: "Invalid number. Try again.",
+    TOO_SMALL: "Too small",
+    TOO_BIG: "Too big",
+    INVALID_PERCENT: "Invalid percent. Try again.",
+}
 
 
 class Input:
     """
     A parent class that can be extended to allow for different types of inputs to a formula.
     """
-    # Internal list of preprocess to run before passing on the input
-    # to the subclass. Allows for special handling of for example memory variables.
-    _preprocesses = []
-    # The way we actually get input from the user
-    # Defined here so that it can be overwritten (e.g. to write tests)
-    _reader = lambda: input(">>> ")
-
-    @staticmethod
-    def add_preprocess(preprocess):
-        Input._preprocesses.append(preprocess)
-
-    @staticmethod
-    def overwrite_reader(reader):
-        Input._reader = reader
+    __slots__ = ("name", "optional")
 
     def __init__(self, name="data", optional=False):
         """Initialize the instance.
@@ -31,46 +31,75 @@ class Input:
         """
         self.name = name
         self.optional = optional
-        self.result = None
 
-    def read(self):
+    def read(self, session):
         """Called by the program to retrieve the input value from the user."""
         # Print "Input <name>: " or "Input data: " if name isn't defined.
-        print(f"Input {self.name}:")
+        session.write(f"Input {self.name}:")
         try:
-            self.result = None
-            self.get_result(self.get_input)
-        except DoneCollectingInput:
-            pass
-        return self.result
-
-    def get_input(self):
-        input = Input._reader()
-        self.pre_process_input(input)
+            return self.get_result(lambda: self.get_input(session), session.write)
+        except DoneCollectingInput as e:
+            return e.result
+
+    def get_input(self, session):
+        input = session.read()
+        self.pre_process_input(input, session)
         return input
 
-    def pre_process_input(self, input):
+    def pre_process_input(self, input, session):
         if self.optional and input == "":
             raise DoneCollectingInput
 
-        for preprocess in Input._preprocesses:
-            preprocess_result = preprocess(input)
-            if preprocess_result is None:
-                continue
+        preprocess_result = session.preprocess(self, input)
+        if preprocess_result is not None:
+            raise DoneCollectingInput(preprocess_result)
 
-            self.result = preprocess_result
-            raise DoneCollectingInput
+    def get_result(self, get_input, write=print):
+        """
+        Reads from get_input and returns the parsed value that will be passed on to the formula.
+        By default, reads until check() accepts a value. Can be overridden by subclasses.
+
+        :param write: Function showing a message to the user (the session's write())
+        """
+        for _ in range(MAX_ENTRY_ATTEMPTS):
+            value, code = self.check(get_input())
+            if code == VALID:
+                return value
+            write(_RETRY_MESSAGES.get(code, MESSAGES.get(code)))
+        raise UserInputError
 
-    def get_result(self, get_input) -> None:
+    def check(self, value):
         """
-        Function to be overridden by subclasses. Should read from get_input and return
-        the parsed value that will be passed on to the formula.
+        Function to be overridden by subclasses. Should check a single value (e.g. a line entered by the user or
+        a cell of a file, either a string or an already parsed number) without raising an exception.
+        Returns (parsed value, VALID) or (None, error code) (see validation.py).
         """
-        raise NotImplemented("Please use a subclass of Input such as NumInput or ListInput")
+        if type(self).parse is Input.parse:
+            raise NotImplementedError("Please use a subclass of Input such as NumInput or ListInput")
+        # Subclasses that only define parse() are checked by catching its errors
+        try:
+            return self.parse(value), VALID
+        except ValueError:
+            return None, BAD_NUMBER
+
+    def check_column(self, values):
+        """
+        Checks a whole column of values (e.g. from a file). Returns the list of parsed values
+        (None where invalid) and a bytearray of error codes. Subclasses can override it with a faster version.
+        """
+        return check_column(self.check, values, self.optional)
+
+    def parse(self, value):
+        """Returns the parsed value or raises ValueError if the value is invalid."""
+        value, code = self.check(value)
+        if code != VALID:
+            raise ValueError(MESSAGES[code])
+        return value
 
 
 class NumInput(Input):
     """Input that accepts a number from the user."""
+    __slots__ = ("require_int", "min", "max")
 
     def __init__(self, name="number", require_int=False, min=None, max=None, **kwargs):
         super(NumInput, self).__init__(name=name, **kwargs)
@@ -78,50 +107,77 @@ class NumInput(Input):
         self.min = min
         self.max = max
 
-    def get_result(self, get_input):
-        for _ in range(MAX_ENTRY_ATTEMPTS):
-            try:
-                i = get_input()
-                num = int(i) if self.require_int else float(i)
-                if self.min is not None and num < self.min:
-                    print("Too small")
+    def check(self, value):
+        num, code = to_int(value) if self.require_int else to_float(value)
+        if code != VALID:
+            return None, code
+        if self.min is not None and num < self.min:
+            return None, TOO_SMALL
+        if self.max is not None and num > self.max:
+            return None, TOO_BIG
+        return num, VALID
+
+    def check_column(self, values):
+        if self.require_int:
+            return super().check_column(values)
+
+        # Same as check() but inlined since columns can have millions of values
+        low = self.min if self.min is not None else -math.inf
+        high = self.max if self.max is not None else math.inf
+        optional = self.optional
+        parsed = []
+        append = parsed.append
+        codes = bytearray(len(values))
+        for i, value in enumerate(values):
+            if value is None or value == "":
+                append(None)
+                if not optional:
+                    codes[i] = MISSING
+                continue
+            if isinstance(value, str):
+                if not is_float(value):
+                    append(None)
+                    codes[i] = BAD_NUMBER
                     continue
-                if self.max is not None and num > self.max:
-                    print("Too big")
+                num = float(value)
+            else:
+                num, code = to_float(value)
+                if code != VALID:
+                    append(None)
+                    codes[i] = code
                     continue
-                self.result = num
-                return
-            except ValueError:
-                print("Invalid number. Try again.")
-        raise UserInputError
+            if num < low:
+                append(None)
+                codes[i] = TOO_SMALL
+            elif num > high:
+                append(None)
+                codes[i] = TOO_BIG
+            else:
+                append(num)
+        return parsed, codes
 
 
 class PercentInput(Input):
     """Input that accepts a percent value as either a decimal or a percent."""
+    __slots__ = ()
 
     def __init__(self, name="number (percent)", **kwargs):
         super(PercentInput, self).__init__(name=name, **kwargs)
 
-    def get_result(self, get_input):
-        for _ in range(MAX_ENTRY_ATTEMPTS):
-            try:
-                str_i = get_input()
-                float_i = float(str_i)
-                if 0 <= float_i <= 1:
-                    self.result = float_i
-                elif 1 <= float_i <= 100:
-                    self.result = float_i / 100
-                else:
-                    print("Invalid percent. Try again.")
-                    continue
-                return
-            except ValueError:
-                print("Invalid number. Try again.")
-        raise UserInputError
+    def check(self, value):
+        float_i, code = to_float(value)
+        if code != VALID:
+            return None, code
+        if 0 <= float_i <= 1:
+            return float_i, VALID
+        elif 1 <= float_i <= 100:
+            return float_i / 100, VALID
+        return None, INVALID_PERCENT
 
 
 class IntInput(NumInput):
     """Input that accepts an integer from the user."""
+    __slots__ = ()
 
     def __init__(self, name="integer", **kwargs):
         super(IntInput, self).__init__(name, require_int=True, **kwargs)
@@ -129,25 +185,40 @@ class IntInput(NumInput):
 
 class ListInput(Input):
     """Input that accepts a list of numbers from the user."""
+    __slots__ = ()
 
     def __init__(self, name="list", **kwargs):
         super(ListInput, self).__init__(name=name, **kwargs)
 
-    def get_result(self, get_input):
-        self.result = []
+    def get_result(self, get_input, write=print):
+        result = []
         consecutive_failures = 0
         while True:
-            try:
-                i = get_input()
-                self.result.append(float(i))
+            i = get_input()
+            if is_float(i):
+                result.append(float(i))
                 consecutive_failures = 0
-            except ValueError:
-                if self.result and i == "":
-                    break
-                consecutive_failures += 1
-                if consecutive_failures == MAX_ENTRY_ATTEMPTS:
-                    raise UserInputError
-                print("Invalid number. Try again.")
-
+                continue
+            if result and i == "":
+                return result
+            consecutive_failures += 1
+            if consecutive_failures == MAX_ENTRY_ATTEMPTS:
+                raise UserInputError
+            write(_RETRY_MESSAGES[BAD_NUMBER])
+
+    def check(self, value):
+        # In a file, a list is either already parsed or the numbers are separated by spaces or semicolons
+        if isinstance(value, str):
+            value = _LIST_SEPARATOR.split(value.strip())
+        result = []
+        for i in value:
+            number, code = to_float(i)
+            if code != VALID:
+                return None, code
+            result.append(number)
+        return result, VALID
+
+
+_LIST_SEPARATOR = re.compile(r"[;\s]+")
 
 ALL_INPUT_TYPES = (ListInput, NumInput, IntInput, PercentInput)
@@ -10,13 +10,7 @@ class Folder(Element):
     """
     A folder or directory that can store other folders or formulas.
     """
-    # Persistent content is content that is found across all folders
-    _persistent_children: List[Element] = []
-
-    @staticmethod
-    def add_persistent_child(persistent_child: Element):
-        """Add an element to all the folder"""
-        Folder._persistent_children.append(persistent_child)
+    __slots__ = ("children", "subfolders", "is_root_folder")
 
     def __init__(self, folder_name, is_root_folder=False):
         """
@@ -24,38 +18,54 @@ class Folder(Element):
         :param is_root_folder: Specifies if this is the root folder
         """
         super().__init__(folder_name)
-        self.children = set()  # Contents of the folder, starts empty
+        self.children = []  # Contents of the folder, starts empty
+        self.subfolders = None  # Folders in children by name (created when the first folder is added)
         self.is_root_folder = is_root_folder
-        self.leave_folder_child = _LeaveFolder(self.is_root_folder)
 
-    def get_children(self) -> List[Element]:
-        # Add the Leave Folder option and any persistent content
-        children = [self.leave_folder_child] + Folder._persistent_children
+    @property
+    def leave_folder_child(self):
+        # Every folder shares the same Quit or Go back element
+        return _QUIT if self.is_root_folder else _GO_BACK
+
+    def add_child(self, element: Element):
+        self.children.append(element)
+        if isinstance(element, Folder):
+            if self.subfolders is None:
+                self.subfolders = {}
+            self.subfolders[element.name] = element
+
+    def get_subfolder(self, folder_name):
+        """Returns the folder in this folder's children with the given name or None if there isn't one."""
+        return self.subfolders.get(folder_name) if self.subfolders is not None else None
+
+    def get_children(self, session) -> List[Element]:
+        # Add the Leave Folder option and any persistent content (content found across all folders)
+        children = [self.leave_folder_child] + session.persistent_children
         # Add the folders contents by name for easy navigation (base content always comes first)
-        children.extend(sorted(list(self.children), key=lambda x: x.name))
+        children.extend(sorted(self.children, key=lambda x: x.name))
         return children
 
-    def select_child(self):
-        children = self.get_children()
+    def select_child(self, session):
+        children = self.get_children(session)
 
         # Print them contents of the folder to the user
         for i, element in enumerate(children):
-            print(f"{i}:\t{element.name}")
+            session.write(f"{i}:\t{element.name}")
 
         # Let the user pick a number representing the desired element
-        return children[IntInput("formula number", min=0, max=len(children)).read()]
+        return children[IntInput("formula number", min=0, max=len(children)).read(session)]
 
-    def run(self):
+    def run(self, session):
         while True:
             # If there's only one element, select that element to run
             if len(self.children) == 1:
-                element_to_run = next(iter(self.children))
+                element_to_run = self.children[0]
             # Otherwise let the user pick
             else:
-                element_to_run = self.select_child()
+                element_to_run = self.select_child(session)
 
             # Run the element
-            should_leave = element_to_run.run()
+            should_leave = element_to_run.run(session)
 
             # If we should leave break (which returns to parent folder)
             # Also if there was only one element break otherwise we have an
@@ -68,9 +78,14 @@ class _LeaveFolder(Element):
     """
     A simple element that will return True when run indicating the callee should exit its call loop.
     """
+    __slots__ = ()
 
     def __init__(self, is_in_root):
         super().__init__("Quit" if is_in_root else "Go back")
 
-    def run(self):
+    def run(self, session):
         return True
+
+
+_QUIT = _LeaveFolder(is_in_root=True)
+_GO_BACK = _LeaveFolder(is_in_root=False)
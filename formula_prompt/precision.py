@@ -0,0 +1,329 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+precision.py lets formulas be evaluated in log space or with exact arithmetic.
+
+Modes:
+
+float -- The default, formulas run as written.
+
+log -- comb(), factorial(), power() and exp() return LogFloat, a non-negative number stored as its
+logarithm. Products of huge and tiny numbers (e.g. comb(10000, 5000) * 0.5 ** 10000) don't overflow.
+
+exact -- Float inputs are converted to Fraction (using the decimal the user entered, 0.3 is 3/10)
+and comb() and factorial() return Fraction, so formulas using +, -, *, / and integer powers are exact.
+Only formulas registered with exact=True are given Fraction inputs, others (e.g. formulas calling
+SciPy) are evaluated with floats.
+
+Formulas opt in by using comb(), factorial(), power() and exp() from this module instead of the math
+functions. In float mode these behave exactly like the math functions. Log factorials are kept in a table
+shared by all formulas and exact binomial coefficients in a cache, so evaluating a formula again is fast.
+
+The mode is set for a session (Session(precision="log")) or with evaluate(formula, inputs, mode).
+"""
+import contextlib
+import contextvars
+import functools
+import math
+import threading
+from array import array
+
+FLOAT = "float"
+LOG = "log"
+EXACT = "exact"
+MODES = (FLOAT, LOG, EXACT)
+
+_MODE = contextvars.ContextVar("precision", default=FLOAT)
+
+# Number of log factorials kept in the table, larger ones are computed when needed
+_TABLE_LIMIT = 1 << 20
+# The table only grows, a larger table replaces the previous one so it can be read without a lock
+_log_factorials = array("d", [0.0, 0.0])
+_table_lock = threading.Lock()
+
+# Below this k (or n - k), log(comb(n, k)) is found from the exact binomial coefficient
+_SMALL_COMB = 64
+# Exact binomial coefficients and factorials are only cached up to these n so the caches stay
+# below a few MB (comb(n, k) has at most n bits, 512! has about 3800 bits)
+_CACHED_COMB_LIMIT = 4096
+_CACHED_FACTORIAL_LIMIT = 512
+
+
+def current_mode():
+    return _MODE.get()
+
+
+@contextlib.contextmanager
+def precision(mode):
+    """Context manager evaluating comb(), factorial(), power() and exp() in the given mode."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown precision '{mode}'. Expected one of {MODES}.")
+    token = _MODE.set(mode)
+    try:
+        yield
+    finally:
+        _MODE.reset(token)
+
+
+def evaluate(formula, inputs, mode):
+    """Evaluates the formula with the inputs in the given mode (float for formulas that don't support exact)."""
+    if mode == FLOAT or mode == EXACT and not formula.exact:
+        return formula.evaluate(*inputs)
+    with precision(mode):
+        if mode == EXACT:
+            inputs = [to_exact(value) for value in inputs]
+        # Not formula.evaluate() since lookup tables only hold floats
+        return formula.call(*inputs)
+
+
+def to_exact(value):
+    """Converts floats (and lists of floats) to the Fraction of their decimal representation."""
+    from fractions import Fraction
+    if isinstance(value, float) and math.isfinite(value):
+        return Fraction(repr(value))
+    if isinstance(value, (list, tuple)):
+        return [to_exact(item) for item in value]
+    return value
+
+
+def log_factorial(n):
+    """Returns log(n!) from the shared table."""
+    table = _log_factorials
+    if n < len(table):
+        return table[n]
+    if n >= _TABLE_LIMIT:
+        return math.lgamma(n + 1)
+    _grow_table(n)
+    return _log_factorials[n]
+
+
+def _grow_table(n):
+    global _log_factorials
+    with _table_lock:
+        table = _log_factorials
+        if n < len(table):
+            return
+        size = min(_TABLE_LIMIT, max(2 * len(table), n + 1))
+        new_table = array("d", table)
+        new_table.extend(math.lgamma(i + 1) for i in range(len(table), size))
+        _log_factorials = new_table
+
+
+def log_comb(n, k):
+    """Returns log(comb(n, k)), -inf if comb(n, k) is 0."""
+    if k < 0 or k > n:
+        return -math.inf
+    m = n - k
+    if min(k, m) <= _SMALL_COMB:
+        return math.log(_exact_comb(n, k))
+    # Subtracting the log factorials would lose most of the precision for large n (they're much larger than
+    # the result). Stirling's formula instead, with the terms that cancel out removed.
+    return (k * math.log(n / k) - m * math.log1p(-k / n) + 0.5 * math.log(n / (2 * math.pi * k * m))
+            + _stirling_error(n) - _stirling_error(k) - _stirling_error(m))
+
+
+def _stirling_error(n):
+    """log(n!) - log(sqrt(2 pi n) (n / e) ** n) for n > _SMALL_COMB."""
+    n2 = n * n
+    return (1 / 12 - (1 / 360 - 1 / (1260 * n2)) / n2) / n
+
+
+def _exact_comb(n, k):
+    return _cached_comb(n, k) if n <= _CACHED_COMB_LIMIT else math.comb(n, k)
+
+
+def _exact_factorial(n):
+    return _cached_factorial(n) if n <= _CACHED_FACTORIAL_LIMIT else math.factorial(n)
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_comb(n, k):
+    return math.comb(n, k)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_factorial(n):
+    return math.factorial(n)
+
+
+def comb(n, k):
+    """Number of ways to choose k items from n (like math.comb) in the current mode."""
+    mode = _MODE.get()
+    if mode == LOG:
+        return LogFloat(log_comb(n, k))
+    if mode == EXACT:
+        from fractions import Fraction
+        return Fraction(_exact_comb(n, k))
+    return _exact_comb(n, k)
+
+
+def factorial(n):
+    """n! (like math.factorial) in the current mode."""
+    mode = _MODE.get()
+    if mode == LOG:
+        return LogFloat(log_factorial(n))
+    if mode == EXACT:
+        from fractions import Fraction
+        return Fraction(_exact_factorial(n))
+    return _exact_factorial(n)
+
+
+def power(x, y):
+    """x ** y in the current mode. In log mode x must not be negative."""
+    if _MODE.get() == LOG:
+        return LogFloat.from_value(x) ** y
+    return x ** y
+
+
+def exp(x):
+    """e ** x in the current mode. Computed in floating point in exact mode."""
+    if _MODE.get() == LOG:
+        return LogFloat(x)
+    return math.exp(x)
+
+
+def round_value(value, decimal_places):
+    """Rounds a Fraction, Decimal or LogFloat to a decimal number for display."""
+    from decimal import Decimal, localcontext
+    from fractions import Fraction
+
+    if isinstance(value, LogFloat):
+        return round(value, decimal_places)
+    if isinstance(value, Fraction):
+        value = round(value, decimal_places)  # Exact, the denominator is now a divisor of 10 ** decimal_places
+        with localcontext() as context:
+            context.prec = len(str(abs(value.numerator))) + decimal_places + 2
+            return (Decimal(value.numerator) / Decimal(value.denominator)).quantize(Decimal(1).scaleb(-decimal_places))
+    if isinstance(value, Decimal) and value.is_finite():
+        with localcontext() as context:
+            context.prec = max(context.prec, value.adjusted() + decimal_places + 2)
+            return value.quantize(Decimal(1).scaleb(-decimal_places))
+    return value
+
+
+def _log(value):
+    if isinstance(value, LogFloat):
+        return value.log
+    if value < 0:
+        raise ValueError(f"Can't use the negative number {value} in log space")
+    return math.log(value) if value else -math.inf
+
+
+@functools.total_ordering
+class LogFloat:
+    """
+    A non-negative number stored as its natural logarithm, so it doesn't overflow or underflow.
+    Supports arithmetic with other LogFloat and non-negative numbers.
+    """
+    __slots__ = ("log", "digits")
+
+    def __init__(self, log, digits=None):
+        """
+        :param log: The natural logarithm of the number (-inf for 0)
+        :param digits: Number of significant digits to display, all of them if None
+        """
+        self.log = log
+        self.digits = digits
+
+    @classmethod
+    def from_value(cls, value):
+        return value if isinstance(value, LogFloat) else cls(_log(value))
+
+    def __mul__(self, other):
+        return LogFloat(self.log + _log(other))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        other = _log(other)
+        if other == -math.inf:
+            raise ZeroDivisionError("division by zero")
+        return LogFloat(self.log - other)
+
+    def __rtruediv__(self, other):
+        if self.log == -math.inf:
+            raise ZeroDivisionError("division by zero")
+        return LogFloat(_log(other) - self.log)
+
+    def __pow__(self, exponent):
+        if exponent == 0:
+            return LogFloat(0.0)
+        return LogFloat(self.log * exponent)
+
+    def __add__(self, other):
+        a, b = self.log, _log(other)
+        if a < b:
+            a, b = b, a
+        if b == -math.inf:
+            return LogFloat(a)
+        return LogFloat(a + math.log1p(math.exp(b - a)))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return LogFloat._subtract(self.log, _log(other))
+
+    def __rsub__(self, other):
+        return LogFloat._subtract(_log(other), self.log)
+
+    @staticmethod
+    def _subtract(a, b):
+        if b > a:
+            raise ValueError("The result of the subtraction is negative and can't be stored in log space")
+        if b == -math.inf:
+            return LogFloat(a)
+        if a == b:
+            return LogFloat(-math.inf)
+        return LogFloat(a + math.log1p(-math.exp(b - a)))
+
+    def __float__(self):
+        try:
+            return math.exp(self.log)
+        except OverflowError:
+            return math.inf
+
+    def __bool__(self):
+        return self.log != -math.inf
+
+    def __eq__(self, other):
+        if isinstance(other, LogFloat):
+            return self.log == other.log
+        try:
+            return other >= 0 and self.log == _log(other)
+        except TypeError:
+            return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, LogFloat):
+            return self.log < other.log
+        try:
+            return other > 0 and self.log < _log(other)
+        except TypeError:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(float(self))
+
+    def __round__(self, ndigits=None):
+        """Rounds like a float when the number is large enough to show, otherwise keeps ndigits significant digits."""
+        if ndigits is None:
+            return round(float(self))
+        if math.log(10 ** -ndigits) <= self.log < math.log(1e300):
+            return round(float(self), ndigits)
+        return LogFloat(self.log, digits=ndigits)
+
+    def __repr__(self):
+        if self.log == -math.inf:
+            return "0.0"
+        exponent10 = self.log / math.log(10)
+        exponent = math.floor(exponent10)
+        mantissa = 10 ** (exponent10 - exponent)
+        digits = self.digits if self.digits is not None else 15
+        text = f"{mantissa:.{digits}f}".rstrip("0").rstrip(".") if self.digits is None else f"{mantissa:.{digits}f}"
+        if text.startswith("10"):  # Rounding the mantissa up (e.g. 9.99996 -> 10.0000)
+            exponent += 1
+            text = f"{mantissa / 10:.{digits}f}"
+            if self.digits is None:
+                text = text.rstrip("0").rstrip(".")
+        return f"{text}e{exponent:+d}"
+
+    __str__ = __repr__
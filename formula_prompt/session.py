@@ -0,0 +1,133 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+session.py defines the Session which holds all the state of a running prompt.
+
+Formulas, inputs and folders don't store anything while running, everything that
+changes (memory, extensions, how input is read and how text and results are printed) lives in the session.
+This allows several sessions to run at the same time, for example in different threads.
+"""
+import functools
+import re
+
+from formula_prompt.extensions import Extension
+from formula_prompt.extensions.memory import Memory
+from formula_prompt.precision import FLOAT, MODES, evaluate
+
+
+def _read_line():
+    return input(">>> ")
+
+
+class Session:
+    """
+    The state of one prompt.
+    """
+
+    def __init__(self, reader=None, result_printer=None, precision=FLOAT, writer=None):
+        """
+        :param reader: Function called without arguments that returns the next line entered by the user.
+        Defaults to reading from the terminal.
+        :param result_printer: Function called with the result of a formula to display it. Defaults to print.
+        :param precision: How formulas are evaluated, one of 'float', 'log' or 'exact' (see precision.py)
+        :param writer: Function called with every line of text shown to the user (menus, prompts and messages).
+        Defaults to print.
+        """
+        if precision not in MODES:
+            raise ValueError(f"Unknown precision '{precision}'. Expected one of {MODES}.")
+        self.reader = reader if reader is not None else _read_line
+        self.result_printer = result_printer if result_printer is not None else print
+        self.writer = writer if writer is not None else print
+        self.precision = precision
+        # Functions run on the lines the user enters before they are passed to the input.
+        # Allows for special handling of for example memory variables.
+        self.preprocesses = []
+        # Input type -> [(pattern, preprocess)] for the preprocesses that apply to that type, built when first needed
+        self._dispatch = {}
+        # Hooks of the extensions called around the evaluation of formulas
+        self._before_formula = []
+        self._after_formula = []
+        # Elements that are found in every folder (e.g. the memory options)
+        self.persistent_children = []
+        # Variables saved by the memory extension
+        self.memory = Memory()
+        # Names of the extensions that were registered, an extension is only registered once per session
+        self.extensions = set()
+
+    def add_extension(self, extension: Extension):
+        """Adds the extension to the session unless an extension with the same name was already added."""
+        if extension.name in self.extensions:
+            return
+        self.extensions.add(extension.name)
+
+        # Only keep the hooks that the extension overrides so lines and formulas don't go through empty hooks
+        extension_type = type(extension)
+        if extension_type.preprocess is not Extension.preprocess:
+            self.add_preprocess(functools.partial(extension.preprocess, self), extension.input_types,
+                                extension.pattern)
+        if extension_type.before_formula is not Extension.before_formula:
+            self._before_formula.append(functools.partial(extension.before_formula, self))
+        if extension_type.after_formula is not Extension.after_formula:
+            self._after_formula.append(functools.partial(extension.after_formula, self))
+        extension.register(self)
+
+    def add_preprocess(self, preprocess, input_types=None, pattern=None):
+        """
+        :param preprocess: Function called with a line entered by the user. Returns the value of the input
+        or None to let the input parse the line.
+        :param input_types: Type or tuple of types of the inputs the preprocess applies to. Defaults to all inputs.
+        :param pattern: Regular expression that a line must fully match to be preprocessed. Defaults to all lines.
+        """
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        self.preprocesses.append(_Preprocess(preprocess, input_types, pattern))
+        self._dispatch.clear()
+
+    def preprocess(self, input_description, line):
+        """Runs the preprocesses that apply to the input on the line and returns the first value found or None."""
+        preprocesses = self._dispatch.get(type(input_description))
+        if preprocesses is None:
+            preprocesses = [(preprocess.pattern, preprocess.func) for preprocess in self.preprocesses
+                            if preprocess.input_types is None or isinstance(input_description, preprocess.input_types)]
+            self._dispatch[type(input_description)] = preprocesses
+
+        for pattern, func in preprocesses:
+            if pattern is not None and pattern.fullmatch(line) is None:
+                continue
+            result = func(line)
+            if result is not None:
+                return result
+        return None
+
+    def evaluate(self, formula, inputs):
+        """Evaluates the formula with the inputs, running the hooks of the extensions before and after."""
+        for before_formula in self._before_formula:
+            new_inputs = before_formula(formula, inputs)
+            if new_inputs is not None:
+                inputs = new_inputs
+        result = evaluate(formula, inputs, self.precision)
+        for after_formula in self._after_formula:
+            new_result = after_formula(formula, inputs, result)
+            if new_result is not None:
+                result = new_result
+        return result
+
+    def add_persistent_child(self, persistent_child):
+        """Add an element to all the folders"""
+        self.persistent_children.append(persistent_child)
+
+    def read(self):
+        """Read a line entered by the user."""
+        return self.reader()
+
+    def write(self, message=""):
+        """Show a line of text to the user."""
+        self.writer(str(message))
+
+
+class _Preprocess:
+    __slots__ = ("func", "input_types", "pattern")
+
+    def __init__(self, func, input_types, pattern):
+        self.func = func
+        self.input_types = input_types
+        self.pattern = pattern
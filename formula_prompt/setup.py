@@ -8,82 +8,221 @@ Important functions:
 register_formula() -- Should be used as a function decorator to register
 formulas into this library.
 
+register_cumulative() -- Registers the cumulative distribution of a probability mass function.
+
 launch_prompt() -- Starts the prompt using the registered formulas.
+
+get_formula() -- Returns a registered formula by name (e.g. to evaluate it without the prompt).
+
+Registering a formula only records it. The modules and folders of the prompt are only
+imported and built when launch_prompt() is called, so using the library without the
+prompt (e.g. with evaluate_many()) doesn't pay for them.
 """
+import functools
+import threading
+
 from formula_prompt.core import *
-from formula_prompt.inputs import Input
-from formula_prompt.navigation import Folder
-from formula_prompt.extensions.memory import register_memory_extension
+from formula_prompt.inputs import Input, ListInput
 
 _DEFAULT_NUMBER_OF_DECIMALS = 4
 
-# Initialize a root folder that one can add formulas to (via @register_formula decorator)
-NAVIGATION_ROOT = Folder(None, is_root_folder=True)
+# All the registered formulas by name
+_FORMULAS = {}
+# The root folder of the navigation, built by _get_navigation_root() when the prompt is first launched
+_navigation_root = None
+# Formulas registered but not added to the navigation yet
+_formulas_to_place = []
+# Guards _navigation_root and _formulas_to_place (formulas may be registered or the prompt launched from any thread)
+_navigation_lock = threading.Lock()
 
 
-def register_formula(func_inputs, decimal_places=_DEFAULT_NUMBER_OF_DECIMALS, name=None):
+def register_formula(func_inputs=None, decimal_places=_DEFAULT_NUMBER_OF_DECIMALS, name=None, table=None,
+                     compile=False, exact=False):
     """
     Function decorator that adds a formula to the list of registered formulas
 
     :param func_inputs: Element of type <Input> or list of <Input> elements representing
-    the inputs that should be passed to the formula
+    the inputs that should be passed to the formula. If not specified, the inputs are inferred
+    from the type hints of the function's parameters (see signatures.py).
     :param decimal_places: Number of decimal places to round your answer to before printing
     :param name: A name for the function. If the name contains '.', this will be considered as a folder.
+    :param table: Optional <LookupTable> used to answer the formula by interpolating in a precomputed grid.
+    :param compile: Whether to compile the formula into a kernel that computes shared subexpressions once
+    and evaluates batches of inputs with NumPy (see compiler.py). Only for formulas made of arithmetic operations.
+    :param exact: Whether the formula supports the exact precision, i.e. it gives exact results for Fraction inputs
+    (see precision.py). Other formulas are evaluated with floats in sessions using the exact precision.
+    :raises TypeError: If the inputs don't match the function's parameters or the formula can't be compiled
     """
-    # If only one argument is passed, wrap it by a tuple
-    if isinstance(func_inputs, Input):
-        func_inputs = (func_inputs,)
+    # Allow using the decorator without parentheses (@register_formula)
+    if callable(func_inputs) and not isinstance(func_inputs, Input):
+        return register_formula()(func_inputs)
 
     # Define the decorator
     def decorator(func):
-        # Register the formula in the root folder (the folder will handle placing it in the right location)
-        _add_formula(NAVIGATION_ROOT.children,
-                     Formula(func, func_inputs, name if name is not None else func.__name__, decimal_places))
+        from formula_prompt.signatures import make_caller
+
+        formula_name = name if name is not None else func.__name__
+        inputs = _get_inputs(func, func_inputs)
+        call = make_caller(func, inputs, formula_name)
+        if compile:
+            call = _compile(call, inputs, formula_name)
+        _register(Formula(func, inputs, formula_name, decimal_places, table, call, exact))
         # Return the wrapped function
         return func
 
     return decorator
 
 
-def _add_formula(contents, formula: Formula, path=None, depth=0):
+def register_cumulative(pmf, func_inputs=None, decimal_places=_DEFAULT_NUMBER_OF_DECIMALS, name=None, start=0,
+                        exact=False):
+    """
+    Function decorator that registers the cumulative distribution of a probability mass function (pmf).
+    The decorated function should return the ratio pmf(x + 1, *params) / pmf(x, *params) which
+    is used to find each term of the sum from the previous one.
+
+    The decorator returns the cumulative distribution as a function called with (x, *params).
+
+    :param pmf: The probability mass function, called with (x, *params)
+    :param func_inputs: Same as for register_formula() (inferred from the decorated function if not specified).
+    The first input is x.
+    :param decimal_places: Same as for register_formula()
+    :param name: Same as for register_formula(). Defaults to the name of the decorated function.
+    :param start: Smallest x of the distribution. Either an integer or a function called with (*params).
+    :param exact: Same as for register_formula()
+    """
+    def decorator(ratio):
+        from formula_prompt.cumulative import CumulativeDistribution
+        from formula_prompt.signatures import make_caller
+
+        formula_name = name if name is not None else ratio.__name__
+        inputs = _get_inputs(ratio, func_inputs)
+        # The pmf and the ratio are called with the same inputs
+        make_caller(pmf, inputs, formula_name)
+        make_caller(ratio, inputs, formula_name)
+
+        cumulative = CumulativeDistribution(pmf, ratio, start)
+        # Give the distribution the name, module and documentation of the decorated function
+        functools.update_wrapper(cumulative, ratio)
+        _register(Formula(cumulative, inputs, formula_name, decimal_places, exact=exact))
+        return cumulative
+
+    return decorator
+
+
+def get_formula(name) -> Formula:
+    """
+    Returns the registered formula with the given name (e.g. 'distributions.binomial').
+    """
+    try:
+        return _FORMULAS[name]
+    except KeyError:
+        raise KeyError(f"No formula named '{name}' is registered") from None
+
+
+def _get_inputs(func, func_inputs):
+    """Returns the inputs as a tuple, inferring them from func's type hints if func_inputs is None."""
+    if func_inputs is None:
+        from formula_prompt.signatures import infer_inputs
+        return infer_inputs(func)
+    # If only one argument is passed, wrap it by a tuple
+    if isinstance(func_inputs, Input):
+        return (func_inputs,)
+    # Tuples are smaller than lists and the inputs don't change
+    return tuple(func_inputs)
+
+
+def _compile(call, inputs, name):
+    from formula_prompt.compiler import compile_formula
+
+    if any(isinstance(input_description, ListInput) for input_description in inputs):
+        raise TypeError(f"Formula '{name}' can't be compiled since it has a list input.")
+    try:
+        return compile_formula(call, len(inputs))
+    except TypeError as e:
+        raise TypeError(f"Formula '{name}' can't be compiled: {e}") from None
+
+
+def _register(formula: Formula):
+    _FORMULAS[formula.name] = formula
+    with _navigation_lock:
+        _formulas_to_place.append(formula)
+
+
+def _get_navigation_root():
+    """Returns the root folder of the navigation after adding the formulas registered since the last call."""
+    global _navigation_root
+    from formula_prompt.navigation import Folder
+
+    with _navigation_lock:
+        if _navigation_root is None:
+            _navigation_root = Folder(None, is_root_folder=True)
+        # Add the formulas in the root folder (the folder will handle placing them in the right location)
+        for formula in _formulas_to_place:
+            _add_formula(_navigation_root, formula)
+        _formulas_to_place.clear()
+        return _navigation_root
+
+
+def __getattr__(name):
+    # NAVIGATION_ROOT used to be built when the module was imported
+    if name == "NAVIGATION_ROOT":
+        return _get_navigation_root()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def _add_formula(folder, formula: Formula, path=None, depth=0):
     """
     Add a formula to the folder. Gets called recursively if the formula lives in a nested folder.
 
+    :param folder: The Folder to add the formula to
     :param formula: The Formula to add
     :param path: A list of the names of all the folders and the formula
     :param depth: Current position in the list (how deep we are in the nested folders)
     """
+    from formula_prompt.navigation import Folder
+
     # If path isn't set, we create it by splitting the name at the dots ('.')
     if path is None:
         path = formula.name.split(".")
 
-    # If we're at the end of the path (no more nested folders) we add the formula the current folder (self)
+    # If we're at the end of the path (no more nested folders) we add the formula the current folder
     if depth == len(path):
-        contents.add(formula)
+        folder.add_child(formula)
         return
 
     # Otherwise we need to go into the nested folder
     # The folders name is the formula name up the current folder
     folder_name = ".".join(path[:depth + 1])
-    # We check if the folder already exists
-    for element in contents:
-        if isinstance(element, Folder) and element.name == folder_name:
-            # If it does, add the formula to that folder (recursive call)
-            _add_formula(element.children, formula, path, depth + 1)
-            return
-
-    # If the folder doesn't exist, we create it
-    new_folder = Folder(folder_name)
+    # We check if the folder already exists and if it doesn't, we create it
+    subfolder = folder.get_subfolder(folder_name)
+    if subfolder is None:
+        subfolder = Folder(folder_name)
+        folder.add_child(subfolder)
     # And add the formula to it (recursive call)
-    _add_formula(new_folder.children, formula, path, depth + 1)
-    # And then add the folder to the current folder
-    contents.add(new_folder)
+    _add_formula(subfolder, formula, path, depth + 1)
 
 
-def launch_prompt(enable_memory=True):
+def launch_prompt(enable_memory=True, session=None, extensions=(), enable_history=True):
     """
     Launches the prompt at the navigation root folder.
+
+    :param enable_memory: Whether to add the options to save inputs in memory
+    :param session: The Session to run the prompt in. Defaults to a new Session reading from the terminal.
+    :param extensions: Other <Extension> to add to the session, their hooks run in this order after the memory's
+    :param enable_history: Whether to record the evaluations in a History kept in memory. Pass a
+    HistoryExtension in extensions instead to choose the History (e.g. to save it in a file).
     """
+    from formula_prompt.extensions.memory import register_memory_extension
+    from formula_prompt.session import Session
+
+    if session is None:
+        session = Session()
     if enable_memory:
-        register_memory_extension()
-    NAVIGATION_ROOT.run()
+        register_memory_extension(session)
+    for extension in extensions:
+        session.add_extension(extension)
+    if enable_history:
+        from formula_prompt.extensions.history import HistoryExtension
+        # Ignored if a HistoryExtension was passed in extensions
+        session.add_extension(HistoryExtension())
+    _get_navigation_root().run(session)
@@ -0,0 +1,144 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+signatures.py reads a formula's signature to infer its inputs and to check them at registration.
+
+Inputs are inferred from the type hints of the formula's parameters:
+
+float -- NumInput
+int -- IntInput
+list[float] -- ListInput
+Annotated[float, PercentInput] -- PercentInput (any Input subclass can be used)
+Annotated[float, Bounds(min=0)] -- NumInput(min=0)
+Annotated[float, NumInput("rate", min=0)] -- The given input is used as is
+
+Parameters that default to None or are annotated with Optional[...] are optional inputs.
+"""
+import collections.abc
+import inspect
+import typing
+from typing import Union, get_args, get_origin
+
+from formula_prompt.inputs import Input, NumInput, IntInput, ListInput, PercentInput
+
+try:
+    from typing import Annotated
+except ImportError:  # Python 3.8
+    Annotated = None
+
+_INPUT_TYPES = {float: NumInput, int: IntInput}
+_LIST_TYPES = (list, tuple, collections.abc.Sequence)
+
+# Shorter name to use in annotations, e.g. Annotated[float, Percent]
+Percent = PercentInput
+
+
+class Bounds:
+    """Annotation metadata setting the min and max of a NumInput or IntInput, e.g. Annotated[int, Bounds(min=0)]."""
+    __slots__ = ("min", "max")
+
+    def __init__(self, min=None, max=None):
+        self.min = min
+        self.max = max
+
+
+def infer_inputs(func):
+    """
+    Returns a tuple of inputs inferred from the type hints of func's parameters.
+    Raises TypeError if a parameter has no type hint or an unsupported one.
+    """
+    if Annotated is not None:
+        hints = typing.get_type_hints(func, include_extras=True)
+    else:
+        hints = typing.get_type_hints(func)
+
+    inputs = []
+    for parameter in _input_parameters(func):
+        if parameter.name not in hints:
+            raise TypeError(f"Can't infer the input for parameter '{parameter.name}' of '{func.__name__}' "
+                            f"since it has no type hint.")
+        inputs.append(_infer_input(func, parameter, hints[parameter.name]))
+    return tuple(inputs)
+
+
+def make_caller(func, inputs, name):
+    """
+    Checks that func accepts the inputs and returns a function that calls func with the inputs in order.
+    Keyword-only parameters are filled by the inputs following the positional parameters.
+
+    :raises TypeError: If func can't be called with the inputs
+    """
+    try:
+        signature = inspect.signature(func)
+    except (TypeError, ValueError):
+        return func  # Can't inspect (e.g. some builtins), the inputs will be passed positionally
+
+    parameters = signature.parameters.values()
+    number_of_positional = len(inputs)
+    keyword_names = []
+    if not any(p.kind == p.VAR_POSITIONAL for p in parameters):
+        number_of_positional = min(len(inputs), sum(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)
+                                                    for p in parameters))
+        keyword_names = [p.name for p in parameters if p.kind == p.KEYWORD_ONLY][:len(inputs) - number_of_positional]
+
+    try:
+        if number_of_positional + len(keyword_names) < len(inputs):
+            signature.bind(*inputs)  # Too many inputs, raises the TypeError describing it
+        signature.bind(*range(number_of_positional), **{keyword: None for keyword in keyword_names})
+    except TypeError as e:
+        raise TypeError(f"Formula '{name}' has {len(inputs)} inputs which don't match the "
+                        f"parameters of '{getattr(func, '__name__', func)}': {e}") from None
+
+    if not keyword_names:
+        return func
+
+    def call(*args):
+        return func(*args[:number_of_positional], **dict(zip(keyword_names, args[number_of_positional:])))
+
+    return call
+
+
+def _input_parameters(func):
+    return [p for p in inspect.signature(func).parameters.values()
+            if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)]
+
+
+def _infer_input(func, parameter, hint):
+    optional = parameter.default is None
+    metadata = []
+    # Unwrap Annotated[...] and Optional[...] (in any order)
+    while True:
+        if Annotated is not None and get_origin(hint) is Annotated:
+            hint, *extra = get_args(hint)
+            metadata.extend(extra)
+        elif get_origin(hint) is Union and type(None) in get_args(hint):
+            others = [arg for arg in get_args(hint) if arg is not type(None)]
+            if len(others) != 1:
+                break
+            optional = True
+            hint = others[0]
+        else:
+            break
+
+    input_type = None
+    options = {}
+    for item in metadata:
+        if isinstance(item, Input):
+            return item
+        if isinstance(item, type) and issubclass(item, Input):
+            input_type = item
+        elif isinstance(item, Bounds):
+            options.update(min=item.min, max=item.max)
+
+    if input_type is None:
+        if hint in _INPUT_TYPES:
+            input_type = _INPUT_TYPES[hint]
+        elif hint in _LIST_TYPES or get_origin(hint) in _LIST_TYPES:
+            input_type = ListInput
+        else:
+            raise TypeError(f"Can't infer the input for parameter '{parameter.name}' of '{func.__name__}' "
+                            f"from type hint {hint!r}.")
+
+    if options and not issubclass(input_type, NumInput):
+        raise TypeError(f"Bounds can't be used for parameter '{parameter.name}' of '{func.__name__}' since "
+                        f"{input_type.__name__} has no min or max.")
+    return input_type(parameter.name.replace("_", " "), optional=optional, **options)
@@ -0,0 +1,407 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+simulation.py estimates the distribution of a formula's result when its inputs are uncertain (Monte Carlo).
+
+Each input is bound to a Distribution (or a fixed value). Samples are drawn a chunk at a time from a seeded
+random generator, the formula is evaluated for the whole chunk and only summary statistics are kept:
+the mean and variance (merged chunk by chunk) and a quantile sketch of bounded size. Millions of
+samples can be simulated without storing them.
+
+Samples follow the rules of the inputs: samples of integer inputs are rounded to the nearest integer
+and samples outside the bounds of an input (min and max, or 0 to 1 for percents which are sampled as
+decimals) aren't evaluated, they are counted in Summary.out_of_range. Fixed values are checked like
+values entered in the prompt.
+
+With NumPy installed, samples are drawn as arrays and compiled formulas (register_formula(..., compile=True))
+are evaluated on the arrays directly. Otherwise the formula is evaluated with evaluate_many() so the
+backends of executor.py can spread the work across cores. The same seed always gives the same
+result on the same installation (NumPy and the standard library don't draw the same numbers).
+"""
+import math
+import random
+
+from formula_prompt.executor import evaluate_many
+from formula_prompt.inputs import NumInput, PercentInput
+from formula_prompt.setup import get_formula
+from formula_prompt.validation import MESSAGES, VALID
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEFAULT_CHUNK_SIZE = 65_536
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Number of samples kept by each level of the quantile sketch, the rank error is roughly 1 / _SKETCH_SIZE per level
+_SKETCH_SIZE = 4096
+
+
+class Distribution:
+    """
+    The distribution of an input. Subclasses implement sample().
+    """
+
+    def sample(self, generator, size):
+        """
+        Returns size samples.
+
+        :param generator: numpy.random.Generator if NumPy is installed, otherwise random.Random
+        :return: A NumPy array or a list
+        """
+        raise NotImplementedError
+
+
+class Normal(Distribution):
+    def __init__(self, mean, std):
+        self.mean = mean
+        self.std = std
+
+    def sample(self, generator, size):
+        if numpy is not None:
+            return generator.normal(self.mean, self.std, size)
+        return [generator.gauss(self.mean, self.std) for _ in range(size)]
+
+
+class LogNormal(Distribution):
+    """Distribution whose logarithm is normal with the given mean and standard deviation."""
+
+    def __init__(self, mean, std):
+        self.mean = mean
+        self.std = std
+
+    def sample(self, generator, size):
+        if numpy is not None:
+            return generator.lognormal(self.mean, self.std, size)
+        return [generator.lognormvariate(self.mean, self.std) for _ in range(size)]
+
+
+class Uniform(Distribution):
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def sample(self, generator, size):
+        if numpy is not None:
+            return generator.uniform(self.low, self.high, size)
+        return [generator.uniform(self.low, self.high) for _ in range(size)]
+
+
+class Triangular(Distribution):
+    def __init__(self, low, mode, high):
+        self.low = low
+        self.mode = mode
+        self.high = high
+
+    def sample(self, generator, size):
+        if numpy is not None:
+            return generator.triangular(self.low, self.mode, self.high, size)
+        return [generator.triangular(self.low, self.high, self.mode) for _ in range(size)]
+
+
+class Choice(Distribution):
+    """Picks one of the values, with probabilities proportional to the weights (equal by default)."""
+
+    def __init__(self, values, weights=None):
+        self.values = list(values)
+        self.weights = list(weights) if weights is not None else None
+
+    def sample(self, generator, size):
+        if numpy is not None:
+            probabilities = None
+            if self.weights is not None:
+                total = sum(self.weights)
+                probabilities = [weight / total for weight in self.weights]
+            return generator.choice(self.values, size, p=probabilities)
+        return generator.choices(self.values, self.weights, k=size)
+
+
+def simulate(formula, distributions, samples=1_000_000, seed=None, quantiles=DEFAULT_QUANTILES,
+             chunk_size=DEFAULT_CHUNK_SIZE, backend="serial", max_workers=None):
+    """
+    Evaluates the formula for random inputs and returns a Summary of the results
+    (a dict of Summary by key if the formula returns a dict).
+
+    :param formula: A Formula or the name of a registered formula
+    :param distributions: Dict of input name to a Distribution or a fixed value. Optional inputs can be left out.
+    :param samples: Number of times the formula is evaluated
+    :param seed: Seed of the random generator, the same seed gives the same results
+    :param quantiles: Quantiles reported in the summary (more can be queried with Summary.quantile())
+    :param chunk_size: Number of samples drawn and evaluated at once
+    :param backend: Backend of evaluate_many() used for formulas that can't be evaluated on arrays
+    :param max_workers: Number of workers used by the backend
+    """
+    if isinstance(formula, str):
+        formula = get_formula(formula)
+    sources = _input_sources(formula, distributions)
+    generator = numpy.random.default_rng(seed) if numpy is not None else random.Random(seed)
+
+    summaries = None
+    failed = 0
+    out_of_range = 0
+    for start in range(0, samples, chunk_size):
+        size = min(chunk_size, samples - start)
+        columns = [source.sample(generator, size) if isinstance(source, Distribution) else _repeat(source, size)
+                   for source in sources]
+        columns, size = _apply_input_rules(formula.inputs, sources, columns, size)
+        out_of_range += min(chunk_size, samples - start) - size
+        if not size:
+            continue
+        results, chunk_failed = _evaluate_chunk(formula, columns, size, backend, max_workers)
+        failed += chunk_failed
+
+        # The keys are only known from the chunks where the formula succeeds for a sample
+        if not any(len(values) for values in results.values()):
+            continue
+        if summaries is None:
+            summaries = {key: Summary(quantiles) for key in results}
+        for key, values in results.items():
+            summary = summaries.get(key)
+            if summary is None:
+                raise TypeError(f"Formula '{formula.name}' doesn't always return the same keys, it can't be simulated")
+            summary.add(values)
+
+    if summaries is None:
+        summaries = {None: Summary(quantiles)}
+    for summary in summaries.values():
+        summary.failed += failed
+        summary.out_of_range = out_of_range
+    return summaries[None] if list(summaries) == [None] else summaries
+
+
+def _input_sources(formula, distributions):
+    names = {input_description.name for input_description in formula.inputs}
+    unknown = [name for name in distributions if name not in names]
+    if unknown:
+        raise ValueError(f"Formula '{formula.name}' has no input named {', '.join(map(repr, unknown))}")
+    sources = []
+    for input_description in formula.inputs:
+        if input_description.name not in distributions and not input_description.optional:
+            raise ValueError(f"No distribution or value for input '{input_description.name}' "
+                             f"of formula '{formula.name}'")
+        source = distributions.get(input_description.name)
+        if source is not None and not isinstance(source, Distribution):
+            # Fixed values follow the same rules as in the prompt (e.g. 5 for a percent is 5%)
+            source, code = input_description.check(source)
+            if code != VALID:
+                raise ValueError(f"Invalid value for input '{input_description.name}' of formula "
+                                 f"'{formula.name}': {MESSAGES[code]}")
+        sources.append(source)
+    return sources
+
+
+def _bounds(input_description):
+    """Returns (whether the input is an integer, min, max) for the inputs whose samples are checked."""
+    if isinstance(input_description, PercentInput):
+        return False, 0, 1
+    if isinstance(input_description, NumInput):
+        return input_description.require_int, input_description.min, input_description.max
+    return None
+
+
+def _apply_input_rules(inputs, sources, columns, size):
+    """
+    Rounds the samples of integer inputs and removes the samples that are out of the inputs' bounds.
+    Returns the new columns and their size.
+    """
+    keep = None
+    for i, (input_description, source) in enumerate(zip(inputs, sources)):
+        bounds = _bounds(input_description)
+        if bounds is None or not isinstance(source, Distribution):
+            continue
+        is_int, low, high = bounds
+        column = columns[i]
+        if numpy is not None and isinstance(column, numpy.ndarray):
+            if is_int:
+                column = columns[i] = numpy.rint(column)
+            in_range = numpy.ones(size, dtype=bool)
+            if low is not None:
+                in_range &= column >= low
+            if high is not None:
+                in_range &= column <= high
+            keep = in_range if keep is None else keep & in_range
+        else:
+            if is_int:
+                column = columns[i] = [round(value) for value in column]
+            in_range = [(low is None or value >= low) and (high is None or value <= high) for value in column]
+            keep = in_range if keep is None else [a and b for a, b in zip(keep, in_range)]
+
+    if keep is None:
+        return columns, size
+    if numpy is not None and isinstance(keep, numpy.ndarray):
+        if keep.all():
+            return columns, size
+        return [column[keep] if isinstance(column, numpy.ndarray) else [value for value, k in zip(column, keep) if k]
+                for column in columns], int(keep.sum())
+    if all(keep):
+        return columns, size
+    return [[value for value, k in zip(column, keep) if k] for column in columns], sum(keep)
+
+
+def _repeat(value, size):
+    if numpy is not None and isinstance(value, (int, float)):
+        return numpy.full(size, value, dtype=float)
+    return [value] * size
+
+
+def _evaluate_chunk(formula, columns, size, backend, max_workers):
+    """Returns a dict of result key (None if the formula returns a number) to values, and the number of failures."""
+    # Compiled formulas run on the arrays directly (see compiler.py)
+    if numpy is not None and hasattr(formula.call, "batch") and formula.table is None \
+            and all(isinstance(column, numpy.ndarray) for column in columns):
+        try:
+            with numpy.errstate(divide="raise", over="raise", invalid="raise", under="ignore"):
+                result = formula.call(*columns)
+        except FloatingPointError:
+            pass  # Some samples fail, find which ones row by row
+        else:
+            if isinstance(result, dict):
+                return {key: _array(value, size) for key, value in result.items()}, 0
+            return {None: _array(result, size)}, 0
+
+    rows = list(zip(*[_to_list(column, input_description)
+                      for column, input_description in zip(columns, formula.inputs)]))
+    try:
+        results = evaluate_many(formula, rows, backend, max_workers)
+    except (ArithmeticError, ValueError, TypeError):
+        results = []
+        for row in rows:
+            try:
+                results.append(formula.evaluate(*row))
+            except (ArithmeticError, ValueError, TypeError):
+                results.append(None)
+
+    failed = sum(result is None for result in results)
+    results = [result for result in results if result is not None]
+    if results and isinstance(results[0], dict):
+        return {key: [result[key] for result in results] for key in results[0]}, failed
+    return {None: results}, failed
+
+
+def _to_list(column, input_description):
+    if numpy is None or not isinstance(column, numpy.ndarray):
+        return column
+    if isinstance(input_description, NumInput) and input_description.require_int and column.dtype.kind == "f":
+        return column.astype(numpy.int64).tolist()
+    return column.tolist()
+
+
+def _array(value, size):
+    return value if isinstance(value, numpy.ndarray) and value.ndim == 1 else numpy.full(size, value, dtype=float)
+
+
+class Summary:
+    """
+    Streaming summary of a formula's results: count, mean, standard deviation, min, max and quantiles.
+    Results that are NaN or infinite and samples for which the formula failed are counted in failed.
+    Samples that were out of the bounds of an input and weren't evaluated are counted in out_of_range.
+    """
+
+    def __init__(self, quantiles=DEFAULT_QUANTILES):
+        self.requested_quantiles = tuple(quantiles)
+        self.count = 0
+        self.failed = 0
+        self.out_of_range = 0
+        self.mean = math.nan
+        self.min = math.nan
+        self.max = math.nan
+        self._m2 = 0.0  # Sum of the squared differences from the mean
+        self._sketch = _QuantileSketch()
+
+    def add(self, values):
+        """Adds a chunk of results (list or NumPy array)."""
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            finite = values[numpy.isfinite(values)]
+            count = len(finite)
+            if count:
+                mean = float(finite.mean())
+                m2 = float(((finite - mean) ** 2).sum())
+                low, high = float(finite.min()), float(finite.max())
+                finite = finite.tolist()
+        else:
+            finite = [float(value) for value in values if math.isfinite(value)]
+            count = len(finite)
+            if count:
+                mean = math.fsum(finite) / count
+                m2 = math.fsum((value - mean) ** 2 for value in finite)
+                low, high = min(finite), max(finite)
+        self.failed += len(values) - count
+        if not count:
+            return
+
+        # Merge the chunk's mean and variance with the previous ones (Chan et al.)
+        total = self.count + count
+        if self.count:
+            delta = mean - self.mean
+            self.mean += delta * count / total
+            self._m2 += m2 + delta * delta * self.count * count / total
+            self.min, self.max = min(self.min, low), max(self.max, high)
+        else:
+            self.mean, self._m2, self.min, self.max = mean, m2, low, high
+        self.count = total
+        self._sketch.add(finite)
+
+    @property
+    def variance(self):
+        """Sample variance of the results."""
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def quantile(self, q):
+        """Approximate q-quantile of the results (e.g. 0.5 for the median)."""
+        if not 0 <= q <= 1:
+            raise ValueError("The quantile must be between 0 and 1")
+        return self._sketch.quantile(q)
+
+    @property
+    def quantiles(self):
+        return {q: self.quantile(q) for q in self.requested_quantiles}
+
+    def __str__(self):
+        skipped = [f"{self.failed} failed"] if self.failed else []
+        if self.out_of_range:
+            skipped.append(f"{self.out_of_range} out of range")
+        lines = [f"samples: {self.count}" + (f" ({', '.join(skipped)})" if skipped else ""),
+                 f"mean: {self.mean:.6g}", f"std: {self.std:.6g}", f"min: {self.min:.6g}", f"max: {self.max:.6g}"]
+        lines.extend(f"{q:.0%} quantile: {value:.6g}" for q, value in self.quantiles.items())
+        return "\n".join(lines)
+
+
+class _QuantileSketch:
+    """
+    Keeps a bounded number of samples from which quantiles are estimated (a simplified KLL sketch).
+    Level h holds samples that each stand for 2 ** h results. When a level is full it's sorted
+    and every other sample (starting at a random offset) moves to the next level.
+    """
+
+    def __init__(self, size=_SKETCH_SIZE):
+        self.size = size
+        self.levels = [[]]
+        # Only decides which half of a full level is kept, results don't depend on it beyond the quantile error
+        self._random = random.Random(0)
+
+    def add(self, values):
+        self.levels[0].extend(values)
+        level = 0
+        while len(self.levels[level]) >= self.size:
+            samples = sorted(self.levels[level])
+            self.levels[level] = []
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            self.levels[level + 1].extend(samples[self._random.randrange(2)::2])
+            level += 1
+
+    def quantile(self, q):
+        weighted = sorted((value, 1 << level) for level, samples in enumerate(self.levels) for value in samples)
+        if not weighted:
+            return math.nan
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
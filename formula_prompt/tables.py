@@ -0,0 +1,328 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+tables.py lets expensive formulas be answered from a precomputed lookup table.
+
+The table is a grid of results spanning the range of every input. It is built the
+first time the formula is evaluated, saved to a file and memory-mapped on later runs.
+Values that fall inside the grid are answered by (multi)linear interpolation, everything
+else (values outside the grid, missing optional values or cells that aren't accurate enough)
+falls back to calling the formula itself.
+"""
+import hashlib
+import math
+import mmap
+import os
+import stat
+import struct
+import sys
+import threading
+import types
+from array import array
+from itertools import product
+
+from formula_prompt.core import UserInputError
+
+_MAGIC = b"FPTABLE1"
+# Magic, key (sha1), number of dimensions, tolerance
+_HEADER = struct.Struct("<8s20sId")
+# Lower bound, upper bound, number of points, whether the dimension only takes integers
+_DIMENSION = struct.Struct("<ddI?3x")
+
+# Integer inputs get one grid point per integer. Refuse to build absurdly large grids.
+_MAX_INTEGER_POINTS = 100_000
+# How deep the functions called by the formula are followed when computing the table's key
+_KEY_DEPTH = 3
+
+
+class _Grid:
+    """The values of a table and which cells are accurate, with the strides to index them."""
+    __slots__ = ("values", "valid_cells", "strides", "cell_strides")
+
+    def __init__(self, values, valid_cells, strides, cell_strides):
+        self.values = values
+        self.valid_cells = valid_cells
+        self.strides = strides
+        self.cell_strides = cell_strides
+
+
+class LookupTable:
+    """
+    Passed to register_formula(..., table=LookupTable()) to answer a formula
+    by interpolating in a precomputed grid of results.
+    """
+
+    def __init__(self, points=256, tolerance=1e-6, ranges=None, path=None):
+        """
+        :param points: Number of grid points along each non-integer input.
+        Integer inputs (e.g. IntInput) get one grid point per integer.
+        :param tolerance: Maximum error allowed for an interpolated answer. The error is
+        measured relative to the exact answer when the answer is larger than 1 and absolute otherwise.
+        :param ranges: Optional dict of input name to (min, max) overriding the input's own min and max.
+        :param path: File to store the table in. Defaults to a file in the user's cache directory
+        (~/.cache/formula_prompt or $XDG_CACHE_HOME/formula_prompt).
+        """
+        if points < 2:
+            raise ValueError("A lookup table needs at least 2 points per input")
+        self.points = points
+        self.tolerance = tolerance
+        self.ranges = ranges if ranges is not None else {}
+        self.path = path
+        self.formula = None
+        self._dimensions = None
+        # Only set once the table is completely read so other threads never see a partial table
+        self._grid = None
+        self._build_lock = threading.Lock()
+
+    def bind(self, formula):
+        """Attach the table to a formula and check that every input has a range."""
+        if self.formula is not None:
+            raise ValueError("A LookupTable can only be used by one formula")
+
+        dimensions = []
+        for input_description in formula.inputs:
+            low, high = self.ranges.get(input_description.name,
+                                        (getattr(input_description, "min", None),
+                                         getattr(input_description, "max", None)))
+            if low is None or high is None or not low < high:
+                raise ValueError(f"Formula '{formula.name}' can't use a lookup table since input "
+                                 f"'{input_description.name}' has no min and max.")
+            if getattr(input_description, "require_int", False):
+                low, high = math.ceil(low), math.floor(high)
+                count = high - low + 1
+                if count > _MAX_INTEGER_POINTS:
+                    raise ValueError(f"Input '{input_description.name}' spans too many integers for a lookup table.")
+                dimensions.append((float(low), float(high), count, True))
+            else:
+                dimensions.append((float(low), float(high), self.points, False))
+
+        self.formula = formula
+        self._dimensions = dimensions
+
+    def lookup(self, inputs):
+        """Return the formula's result for the inputs, interpolating when possible."""
+        grid = self._grid
+        if grid is None:
+            grid = self._load()
+
+        location = self._locate(grid, inputs)
+        if location is None or not grid.valid_cells[location[0]]:
+            return self.formula.call(*inputs)
+        return self._interpolate(grid.values, location[1], location[2])
+
+    @staticmethod
+    def _interpolate(values, base, fractions):
+        # Weighted sum of the 2^n corners of the cell (integer inputs have a single corner)
+        result = 0.0
+        for corner in product((0, 1), repeat=len(fractions)):
+            weight = 1.0
+            offset = base
+            for is_upper, (fraction, stride) in zip(corner, fractions):
+                if is_upper:
+                    if stride == 0:
+                        weight = 0.0
+                        break
+                    weight *= fraction
+                    offset += stride
+                else:
+                    weight *= 1 - fraction
+            if weight:
+                result += weight * values[offset]
+        return result
+
+    def _key(self):
+        """
+        Hash of everything the results depend on: the code of the formula and of the functions it calls
+        and the versions of the packages they come from (e.g. SciPy), the grid and the tolerance.
+        """
+        func = self.formula.func
+        description = repr((self.formula.name, getattr(func, "__qualname__", None), _describe(func, _KEY_DEPTH, set()),
+                            sys.version_info[:2], self._dimensions, self.tolerance))
+        return hashlib.sha1(description.encode()).digest()
+
+    def _file_path(self, key):
+        if self.path is not None:
+            return self.path
+        return os.path.join(_cache_directory(), f"{key.hex()}.table")
+
+    def _load(self):
+        with self._build_lock:
+            if self._grid is not None:
+                return self._grid
+
+            key = self._key()
+            path = self._file_path(key)
+            if not self._read(path, key):
+                self._write(path, key, *self._build())
+                if not self._read(path, key):
+                    raise OSError(f"Failed to read lookup table at {path}")
+            return self._grid
+
+    def _read(self, path, key):
+        """Memory-map the table at path. Returns False if the file is missing or outdated."""
+        try:
+            with open(path, "rb") as f:
+                file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        try:
+            magic, file_key, number_of_dimensions, _ = _HEADER.unpack_from(file_map, 0)
+        except struct.error:
+            return False
+        if magic != _MAGIC or file_key != key or number_of_dimensions != len(self._dimensions):
+            return False
+
+        sizes = self._sizes()
+        number_of_points, number_of_cells = sizes[0][-1], sizes[1][-1]
+        values_start = _HEADER.size + _DIMENSION.size * number_of_dimensions
+        cells_start = values_start + 8 * number_of_points
+        if len(file_map) != cells_start + number_of_cells:
+            return False
+
+        view = memoryview(file_map)
+        self._grid = _Grid(view[values_start:cells_start].cast("d"), view[cells_start:], sizes[0][:-1], sizes[1][:-1])
+        return True
+
+    def _sizes(self):
+        """Row-major strides of the grid points and of the cells (the last element is the total size)."""
+        point_strides, cell_strides = [1], [1]
+        for low, high, count, is_int in reversed(self._dimensions):
+            point_strides.insert(0, point_strides[0] * count)
+            cell_strides.insert(0, cell_strides[0] * (count if is_int else count - 1))
+        return (point_strides[1:] + [point_strides[0]], cell_strides[1:] + [cell_strides[0]])
+
+    @staticmethod
+    def _axis(low, high, count, is_int):
+        if is_int:
+            return [low + i for i in range(count)]
+        return [low + (high - low) * i / (count - 1) for i in range(count)]
+
+    def _exact(self, inputs):
+        try:
+            result = self.formula.call(*inputs)
+            return float(result)
+        except (ArithmeticError, ValueError, TypeError, UserInputError):
+            return math.nan
+
+    def _build(self):
+        """Evaluate the formula at every grid point then check every cell's accuracy at its centre."""
+        axes = []
+        for low, high, count, is_int in self._dimensions:
+            axis = self._axis(low, high, count, is_int)
+            axes.append([int(x) for x in axis] if is_int else axis)
+        values = array("d", (self._exact(point) for point in product(*axes)))
+        # Only used to locate the cells, the table isn't visible to lookup() until it's written and read back
+        strides, cell_strides = [x[:-1] for x in self._sizes()]
+        grid = _Grid(values, None, strides, cell_strides)
+
+        cell_axes = []
+        for axis, (low, high, count, is_int) in zip(axes, self._dimensions):
+            cell_axes.append(axis if is_int else [(axis[i] + axis[i + 1]) / 2 for i in range(count - 1)])
+
+        valid_cells = bytearray()
+        for centre in product(*cell_axes):
+            exact = self._exact(centre)
+            _, base, fractions = self._locate(grid, centre)
+            approx = self._interpolate(values, base, fractions)
+            error = abs(approx - exact)
+            valid_cells.append(math.isfinite(approx) and math.isfinite(exact)
+                               and error <= self.tolerance * max(1.0, abs(exact)))
+
+        return values, valid_cells
+
+    def _locate(self, grid, inputs):
+        """
+        Find the cell containing the inputs. Returns the cell's index, the index of its
+        lowest corner and for each input how far along the cell it is (None if outside the grid).
+        """
+        cell = 0
+        base = 0
+        fractions = []
+        for value, (low, high, count, is_int), stride, cell_stride in zip(
+                inputs, self._dimensions, grid.strides, grid.cell_strides):
+            if value is None or not low <= value <= high:
+                return None
+            if is_int:
+                if value != int(value):
+                    return None
+                index = int(value - low)
+                fractions.append((0.0, 0))
+            else:
+                position = (value - low) / (high - low) * (count - 1)
+                index = min(int(position), count - 2)
+                fractions.append((position - index, stride))
+            cell += index * cell_stride
+            base += index * stride
+        return cell, base, fractions
+
+    def _write(self, path, key, values, valid_cells):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so that a reader never sees a partial table
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, key, len(self._dimensions), self.tolerance))
+            for dimension in self._dimensions:
+                f.write(_DIMENSION.pack(*dimension))
+            values.tofile(f)
+            f.write(valid_cells)
+        os.replace(temporary_path, path)
+
+
+def _cache_directory():
+    """Returns the directory of the user's cached tables, creating it only readable by the user."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    directory = os.path.join(base, "formula_prompt")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    # Tables are trusted when they're read back, refuse a directory that other users could have written to
+    if hasattr(os, "getuid"):
+        status = os.stat(directory)
+        if status.st_uid != os.getuid() or status.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"The lookup table directory {directory} belongs to another user or can be "
+                                  f"written by other users. Pass a path to LookupTable instead.")
+    return directory
+
+
+def _describe(value, depth, seen):
+    """
+    Describes a function by its code and the functions and modules it uses (depth levels deep),
+    for modules and functions that aren't written in Python by the version of their package.
+    """
+    if id(value) in seen:
+        return None
+    seen.add(id(value))
+
+    if isinstance(value, types.ModuleType):
+        return "module", value.__name__, _package_version(value.__name__)
+    code = getattr(value, "__code__", None)
+    if code is None:
+        # Builtins, ufuncs, classes... identified by the package that defines them
+        module = getattr(value, "__module__", None)
+        return "object", getattr(value, "__qualname__", None), module, _package_version(module)
+
+    description = [_describe_code(code)]
+    if depth > 0:
+        global_names = getattr(value, "__globals__", {})
+        for name in code.co_names:
+            if name in global_names and callable(global_names[name]) or \
+                    isinstance(global_names.get(name), types.ModuleType):
+                description.append((name, _describe(global_names[name], depth - 1, seen)))
+    return tuple(description)
+
+
+def _describe_code(code):
+    # Nested functions are constants of the code, their repr contains an address that changes on every run
+    return code.co_code, tuple(_describe_code(constant) if isinstance(constant, types.CodeType) else repr(constant)
+                               for constant in code.co_consts)
+
+
+def _package_version(module_name):
+    if not module_name:
+        return None
+    package = sys.modules.get(module_name.partition(".")[0])
+    return getattr(package, "__version__", None)
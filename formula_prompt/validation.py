@@ -0,0 +1,152 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+"""
+validation.py checks values without raising exceptions, one column of values at a time.
+
+Every value gets an error code (VALID if it can be used). Invalid values are collected
+in an ErrorReport so that a batch can continue with the valid rows.
+"""
+import re
+from array import array
+
+# Error codes
+VALID = 0
+MISSING = 1
+BAD_NUMBER = 2
+TOO_SMALL = 3
+TOO_BIG = 4
+INVALID_PERCENT = 5
+FORMULA_ERROR = 6
+BAD_RESULT = 7
+
+MESSAGES = {
+    VALID: "Valid",
+    MISSING: "Missing value",
+    BAD_NUMBER: "Invalid number",
+    TOO_SMALL: "Too small",
+    TOO_BIG: "Too big",
+    INVALID_PERCENT: "Invalid percent",
+    FORMULA_ERROR: "Formula failed",
+    BAD_RESULT: "Result doesn't match the result columns",
+}
+
+# Same syntax as accepted by int() and float() so that they never raise
+_DIGITS = r"\d(?:_?\d)*"
+INT_PATTERN = re.compile(rf"\s*[+-]?{_DIGITS}\s*")
+FLOAT_PATTERN = re.compile(
+    rf"\s*[+-]?(?:(?:{_DIGITS}(?:\.(?:{_DIGITS})?)?|\.{_DIGITS})(?:[eE][+-]?{_DIGITS})?|inf(?:inity)?|nan)\s*",
+    re.IGNORECASE)
+
+# Used in the ErrorReport when an error isn't caused by an input
+NO_INPUT = 0xFFFF
+
+
+def is_float(text):
+    """Returns True if float(text) won't raise an exception."""
+    # Plain decimals (e.g. '-3.5') are by far the most common so check them without the regex
+    # (the sign is removed first so only a dot after it is removed, '.-5' isn't a number)
+    unsigned = text[1:] if text[:1] in "+-" else text
+    return unsigned.replace(".", "", 1).isdecimal() or FLOAT_PATTERN.fullmatch(text) is not None
+
+
+def to_float(value):
+    """Returns (value as a float, error code)."""
+    if isinstance(value, str):
+        return (float(value), VALID) if is_float(value) else (None, BAD_NUMBER)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value), VALID
+    # Rare types (e.g. Decimal), checking them by conversion is fine
+    try:
+        return float(value), VALID
+    except (TypeError, ValueError):
+        return None, BAD_NUMBER
+
+
+def to_int(value):
+    """Returns (value as an int, error code)."""
+    if isinstance(value, str):
+        if INT_PATTERN.fullmatch(value) is None:
+            return None, BAD_NUMBER
+        return int(value), VALID
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value, VALID
+    if isinstance(value, float):
+        return (int(value), VALID) if value.is_integer() else (None, BAD_NUMBER)
+    return None, BAD_NUMBER
+
+
+def validate_column(input_description, values):
+    """
+    Checks every value of a column for the given input.
+    Returns the list of parsed values (None where invalid) and a bytearray of error codes.
+    """
+    return input_description.check_column(values)
+
+
+def check_column(check, values, optional):
+    """
+    Checks every value of a column with check(value) -> (parsed value, error code).
+    Empty values are valid (None) if optional is True, otherwise MISSING.
+    """
+    parsed = []
+    codes = bytearray(len(values))
+    for i, value in enumerate(values):
+        if value is None or value == "":
+            parsed.append(None)
+            if not optional:
+                codes[i] = MISSING
+            continue
+        value, code = check(value)
+        parsed.append(value)
+        codes[i] = code
+    return parsed, codes
+
+
+class ErrorReport:
+    """
+    Compact list of the invalid values of a batch: row index, input and error code for every error.
+    """
+
+    def __init__(self, input_names):
+        """
+        :param input_names: The names of the inputs, errors refer to the inputs by their index in this list
+        """
+        self.input_names = list(input_names)
+        self.number_of_rows = 0  # Number of rows checked, valid or not
+        self.rows = array("q")
+        self.inputs = array("H")
+        self.codes = bytearray()
+
+    def add(self, row, input_index, code):
+        self.rows.append(row)
+        self.inputs.append(input_index)
+        self.codes.append(code)
+
+    def add_column(self, first_row, input_index, codes):
+        """Add the errors of a column returned by validate_column(). first_row is the index of the column's first row."""
+        for i, code in enumerate(codes):
+            if code:
+                self.add(first_row + i, input_index, code)
+
+    def input_name(self, input_index):
+        return self.input_names[input_index] if input_index != NO_INPUT else None
+
+    def counts(self):
+        """Returns the number of errors for every error code."""
+        counts = {}
+        for code in self.codes:
+            counts[code] = counts.get(code, 0) + 1
+        return counts
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        """Iterates over (row index, input name, error code) in the order they were added."""
+        for row, input_index, code in zip(self.rows, self.inputs, self.codes):
+            yield row, self.input_name(input_index), code
+
+    def __str__(self):
+        if not self.codes:
+            return f"{self.number_of_rows} rows, no errors"
+        counts = ", ".join(f"{count} {MESSAGES[code].lower()}" for code, count in sorted(self.counts().items()))
+        return f"{self.number_of_rows} rows, {len(self)} errors ({counts})"
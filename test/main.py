@@ -10,8 +10,8 @@ from examples.stats import *
 
 class FormulaTests(unittest.TestCase):
     def test_mean(self):
-        mock_reader([3, 4])
+        reader = mock_reader([3, 4])
 
         def callback(result):
             print("capture", result)
-        run_and_capture(callback)
\ No newline at end of file
+        run_and_capture(reader, callback)
\ No newline at end of file
@@ -0,0 +1,68 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import importlib.util
+import math
+import random
+import unittest
+
+from formula_prompt.compiler import compile_formula
+from formula_prompt.executor import evaluate_many
+from formula_prompt.inputs import NumInput, ListInput
+from formula_prompt.setup import register_formula
+
+
+def tax_factors(t, d, i):
+    return {"CRF": 1 - t * d / (i + d), "CTF": 1 - t * d / (i + d) * (1 + i / 2) / (1 + i)}
+
+
+def gradient_factor(N, i):
+    return (1 - (1 + i * N) / (1 + i) ** N) / (i ** 2) + abs(-N) // 2 % 3
+
+
+class CompilerTests(unittest.TestCase):
+    def test_same_results(self):
+        generator = random.Random(0)
+        for func, number_of_inputs in ((tax_factors, 3), (gradient_factor, 2)):
+            kernel = compile_formula(func, number_of_inputs)
+            rows = [tuple(generator.uniform(0.01, 0.5) for _ in range(number_of_inputs)) for _ in range(100)]
+            expected = [func(*row) for row in rows]
+            for results in ([kernel(*row) for row in rows], kernel.batch(rows)):
+                for result, expected_result in zip(results, expected):
+                    if isinstance(expected_result, dict):
+                        self.assertEqual(result.keys(), expected_result.keys())
+                        result, expected_result = list(result.values()), list(expected_result.values())
+                    else:
+                        result, expected_result = [result], [expected_result]
+                    for value, expected_value in zip(result, expected_result):
+                        self.assertTrue(math.isclose(value, expected_value, rel_tol=1e-12))
+
+    def test_shared_subexpressions_are_computed_once(self):
+        source = compile_formula(tax_factors, 3).source
+        self.assertEqual(source.count("/ (x1 + x2)"), 1)
+        self.assertEqual(source.count("x2 + x1") + source.count("x1 + x2"), 1)
+        # The constants and results that don't depend on the inputs are kept as is
+        self.assertEqual(compile_formula(lambda x: 2 ** 0.5 + 0 * x, 1).batch([(1,), (2,)]), [2 ** 0.5] * 2)
+
+    def test_errors(self):
+        register_formula([NumInput("x"), NumInput("y")], name="test.compiler.divide", compile=True)(lambda x, y: x / y)
+        with self.assertRaises(ZeroDivisionError):
+            evaluate_many("test.compiler.divide", [(1, 2)] * 10 + [(1, 0)], backend="serial")
+        self.assertEqual(evaluate_many("test.compiler.divide", [(1, 2)] * 10, backend="serial"), [0.5] * 10)
+
+        with self.assertRaises(TypeError):
+            register_formula(NumInput("x"), name="test.compiler.branch", compile=True)(lambda x: x if x > 0 else -x)
+        with self.assertRaises(TypeError):
+            register_formula(NumInput("x"), name="test.compiler.math", compile=True)(lambda x: math.exp(x))
+        with self.assertRaises(TypeError):
+            register_formula(ListInput("x"), name="test.compiler.list", compile=True)(lambda x: x)
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "requires NumPy")
+    def test_large_integers_keep_their_precision(self):
+        kernel = compile_formula(lambda n, k: n * 3 + k, 2)
+        large = 2 ** 60 + 1
+        self.assertEqual(kernel.batch([(large, 1), (2, 1)]), [large * 3 + 1, 7])
+        self.assertEqual(kernel.batch([(2, 0.5), (-2 ** 53, 0)]), [6.5, -3 * 2 ** 53])
+        self.assertEqual(kernel.batch([(float(large), 1)]), [float(large) * 3 + 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import math
+import unittest
+from fractions import Fraction
+
+from formula_prompt import precision
+from formula_prompt.cumulative import CumulativeDistribution
+
+
+def binomial(x, n, p):
+    return math.comb(n, x) * (p ** x) * ((1 - p) ** (n - x))
+
+
+def binomial_ratio(x, n, p):
+    return (n - x) / (x + 1) * p / (1 - p)
+
+
+def precise_binomial(x, n, p):
+    return precision.comb(n, x) * precision.power(p, x) * precision.power(1 - p, n - x)
+
+
+class CumulativeDistributionTests(unittest.TestCase):
+    def test_matches_direct_sum(self):
+        cumulative = CumulativeDistribution(binomial, binomial_ratio)
+        for n, p in ((10, 0.3), (40, 0.75), (5, 0.0)):
+            for x in (7, 0, 3, 5):
+                expected = sum(binomial(i, n, p) for i in range(x + 1))
+                self.assertAlmostEqual(cumulative(x, n, p), expected, places=12)
+
+    def test_start_and_degenerate_ratio(self):
+        cumulative = CumulativeDistribution(binomial, binomial_ratio, start=lambda n, p: 2)
+        self.assertEqual(cumulative(1, 4, 0.5), 0.0)
+        self.assertAlmostEqual(cumulative(4, 4, 1.0), 1.0)
+        self.assertAlmostEqual(cumulative(3, 4, 0.5), (6 + 4) / 16)
+
+    def test_first_term_underflows(self):
+        cumulative = CumulativeDistribution(precise_binomial, binomial_ratio)
+        # 0.5 ** 1500 is 0 and comb(1500, 750) is too large for a float
+        expected = Fraction(1, 2) + Fraction(math.comb(1500, 750), 2 ** 1501)
+        self.assertAlmostEqual(cumulative(750, 1500, 0.5), float(expected), places=10)
+        self.assertAlmostEqual(cumulative(1500, 1500, 0.5), 1.0, places=10)
+        self.assertEqual(cumulative(10, 1500, 0.5), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
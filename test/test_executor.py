@@ -0,0 +1,106 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import pickle
+import unittest
+from array import array
+from unittest import mock
+
+from formula_prompt.core import Formula
+from formula_prompt.executor import SharedSequence, evaluate_many, _default_backend
+from formula_prompt.inputs import ListInput, NumInput
+from formula_prompt.setup import register_formula
+
+
+@register_formula([ListInput("x"), NumInput("scale")], name="test_executor.scaled_sum")
+def scaled_sum(x, scale):
+    return sum(x) * scale
+
+
+def argmax_plus_first(x, offset):
+    return x.index(max(x)) + x[0] + offset
+
+
+def describe_list(x):
+    try:
+        x[0] = 0.0
+        mutable = True
+    except TypeError:
+        mutable = False
+    copy = x.copy()
+    copy[0] = 0.0
+    return type(x).__name__, mutable, x.count(1.5), 2.5 in x, x[1:], list(reversed(x)), copy[:2], x
+
+
+class EvaluateManyTests(unittest.TestCase):
+    def test_backends_agree(self):
+        sample = [float(i) for i in range(1000)]
+        rows = [(sample, i) for i in range(100)]
+        expected = [sum(sample) * i for i in range(100)]
+        for backend in ("serial", "thread", "process"):
+            with self.subTest(backend=backend):
+                self.assertEqual(evaluate_many("test_executor.scaled_sum", rows, backend=backend, max_workers=2),
+                                 expected)
+
+    def test_unregistered_formula(self):
+        # Integers too large for a float and list methods must work the same with every backend
+        formula = Formula(argmax_plus_first, (ListInput("x"), NumInput("offset")), "test_executor.unregistered")
+        integers = [2 ** 60 + 1, 3, 2 ** 61]
+        floats = [0.5, 2.5, 1.5]
+        rows = [(integers if i % 2 else floats, i) for i in range(100)]
+        expected = [2 + 2 ** 60 + 1 + i if i % 2 else 1 + 0.5 + i for i in range(100)]
+        for backend in ("serial", "thread", "process", "auto"):
+            with self.subTest(backend=backend):
+                self.assertEqual(evaluate_many(formula, rows, backend=backend, max_workers=4), expected)
+
+    def test_formula_that_cant_be_pickled(self):
+        formula = Formula(lambda x: x + 1, (NumInput("x"),), "test_executor.lambda")
+        rows = [(i,) for i in range(100)]
+        with self.assertRaisesRegex(TypeError, "isn't registered"):
+            evaluate_many(formula, rows, backend="process", max_workers=2)
+        # The automatic backend evaluates it in this process instead
+        self.assertEqual(evaluate_many(formula, rows, max_workers=2), list(range(1, 101)))
+
+    def test_shared_lists_are_read_only(self):
+        formula = Formula(describe_list, (ListInput("x"),), "test_executor.describe_list")
+        sample = [1.5, 2.5, 0.5, 1.5]
+        described = evaluate_many(formula, [(sample,)] * 4, backend="process", max_workers=2)
+        self.assertEqual(described, [("SharedSequence", False, 2, True, [2.5, 0.5, 1.5], sample[::-1],
+                                      [0.0, 2.5], sample)] * 4)
+        self.assertIs(type(described[0][-1]), list)
+        self.assertEqual(evaluate_many(formula, [(array("d", sample),)], backend="process")[0][4], array("d", sample[1:]))
+
+    def test_shared_sequence(self):
+        sequence = SharedSequence(memoryview(array("d", [3.0, 1.0, 2.0, 1.0])))
+        self.assertEqual((len(sequence), sequence[-1], max(sequence), sum(sequence)), (4, 1.0, 3.0, 7.0))
+        self.assertEqual((sequence.index(1.0), sequence.index(1.0, 2), sequence.index(1.0, -1)), (1, 3, 3))
+        with self.assertRaises(ValueError):
+            sequence.index(1.0, 0, 1)
+        self.assertEqual(sequence, [3.0, 1.0, 2.0, 1.0])
+        self.assertNotEqual(sequence, [3.0, 1.0, 2.0])
+        self.assertEqual(pickle.loads(pickle.dumps(sequence)), [3.0, 1.0, 2.0, 1.0])
+        with self.assertRaises(AttributeError):
+            sequence.append(1.0)
+
+    def test_auto_backend(self):
+        square = Formula(lambda x: x * x, (NumInput("x"),), "test_executor.square")
+        rows = [(float(i),) for i in range(1000)]
+        # Too fast to be worth starting processes
+        backend, sampled = _default_backend(square, rows, max_workers=4)
+        self.assertEqual((backend, sampled), ("serial", [float(i * i) for i in range(16)]))
+        self.assertEqual(_default_backend(square, rows[:10], max_workers=4), ("serial", []))
+
+        with mock.patch("formula_prompt.executor._MIN_SECONDS_FOR_PROCESSES", 0):
+            with mock.patch("multiprocessing.get_context") as get_context:
+                get_context.return_value.get_start_method.return_value = "spawn"
+                self.assertEqual(_default_backend(square, rows, max_workers=4)[0], "serial")
+            if _default_backend(square, rows, max_workers=4)[0] == "process":
+                sample = [0.5, 1.5]
+                self.assertEqual(evaluate_many("test_executor.scaled_sum", [(sample, i) for i in range(40)],
+                                               max_workers=2), [2.0 * i for i in range(40)])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            evaluate_many("test_executor.scaled_sum", [([1.0], 1)], backend="gpu")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import unittest
+
+from formula_prompt.core import Formula
+from formula_prompt.extensions import Extension
+from formula_prompt.extensions.memory import register_memory_extension
+from formula_prompt.inputs import NumInput, ListInput
+from formula_prompt.session import Session
+from test.utilities import mock_reader
+
+
+class Constants(Extension):
+    """Replaces 'pi' by 3.14 for number inputs and records the lines it's called with."""
+    name = "constants"
+    input_types = (NumInput,)
+    pattern = r"[a-z]+"
+
+    def __init__(self):
+        self.lines = []
+
+    def preprocess(self, session, line):
+        self.lines.append(line)
+        return 3.14 if line == "pi" else None
+
+
+class Doubler(Extension):
+    name = "doubler"
+
+    def before_formula(self, session, formula, inputs):
+        return [2 * value for value in inputs]
+
+    def after_formula(self, session, formula, inputs, result):
+        return f"{formula.name} = {result}"
+
+
+class ExtensionTests(unittest.TestCase):
+    def test_preprocess_dispatch(self):
+        constants = Constants()
+        session = Session(reader=mock_reader(["pi", "e", "2", "pi", "1", "2", ""]), writer=lambda line: None)
+        session.add_extension(constants)
+        session.add_extension(Constants())  # Ignored, same name
+        self.assertEqual(len(session.preprocesses), 1)
+
+        self.assertEqual(NumInput("x").read(session), 3.14)
+        # 'e' goes through the extension but isn't replaced, '2' doesn't match the pattern
+        self.assertEqual(NumInput("x").read(session), 2.0)
+        # The extension doesn't apply to lists so 'pi' is an invalid number
+        self.assertEqual(ListInput("x").read(session), [1.0, 2.0])
+        self.assertEqual(constants.lines, ["pi", "e"])
+
+    def test_hooks_run_in_order_and_stop_at_first_value(self):
+        session = Session(reader=mock_reader(["a"]), writer=lambda line: None)
+        register_memory_extension(session)
+        session.add_extension(Constants())
+        session.memory["a"] = 1.0
+        session.memory["pi"] = 3.0
+        self.assertEqual(NumInput("x").read(session), 1.0)
+        self.assertEqual(session.preprocess(NumInput("x"), "pi"), 3.0)
+
+    def test_formula_hooks(self):
+        captured = []
+        session = Session(reader=mock_reader(["1", "2", "0"]), result_printer=captured.append,
+                          writer=lambda line: None)
+        session.add_extension(Doubler())
+        Formula(lambda a, b: a + b, (NumInput("a"), NumInput("b")), "sum").run(session)
+        self.assertEqual(captured, ["sum = 6.0"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from formula_prompt.core import Formula
+from formula_prompt.extensions.history import HistoryExtension
+from formula_prompt.history import History
+from formula_prompt.inputs import NumInput
+from formula_prompt.session import Session
+from test.utilities import mock_reader
+
+
+class HistoryTests(unittest.TestCase):
+    def test_query_by_name_and_time(self):
+        history = History()
+        for i in range(10):
+            history.add("even" if i % 2 == 0 else "odd", (i,), i * i, 0.001, timestamp=100 + i)
+
+        self.assertEqual(len(history), 10)
+        self.assertEqual(sorted(history.names()), ["even", "odd"])
+        self.assertEqual([e.inputs for e in history.query(name="odd")], [(1,), (3,), (5,), (7,), (9,)])
+        self.assertEqual([e.result for e in history.query(since=104, until=107)], [16, 25, 36])
+        self.assertEqual([e.result for e in history.query(name="even", since=103, until=108)], [16, 36])
+        self.assertEqual([e.result for e in history.query(limit=2)], [64, 81])
+        self.assertEqual(history.query(name="unknown"), [])
+
+    def test_lookup(self):
+        history = History()
+        history.add("square", (3,), 9, 0.001)
+        history.add("square", (3,), 9.0, 0.001)
+        history.add("sum", ([1, 2],), 3, 0.001)
+
+        self.assertEqual(history.lookup("square", (3,)).result, 9.0)
+        self.assertIsNone(history.lookup("square", (4,)))
+        self.assertIsNone(history.lookup("sum", ([1, 2],)))
+
+    def test_retention(self):
+        history = History(max_entries=5)
+        for i in range(23):
+            history.add(f"f{i % 3}", (i,), i, 0.001, timestamp=i)
+        self.assertEqual([e.result for e in history], [18, 19, 20, 21, 22])
+        self.assertEqual([e.result for e in history.query(name="f0")], [18, 21])
+        self.assertIsNone(history.lookup("f0", (15,)))
+        self.assertEqual(history.lookup("f0", (18,)).result, 18)
+
+        history = History(max_age=10)
+        for i in range(30):
+            history.add("f", (i,), i, 0.001, timestamp=i)
+        self.assertEqual([e.result for e in history._entries[history._start:]], list(range(19, 30)))
+        # Evaluations are also dropped as time goes by (the timestamps are in 1970)
+        self.assertEqual(len(history.query()), 0)
+        self.assertEqual(history.names(), [])
+
+        with self.assertRaises(ValueError):
+            History(max_entries=0)
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.jsonl")
+            history = History(max_entries=3, path=path)
+            for i in range(7):
+                history.add("f", (i, 0.5), {"value": i}, 0.001, timestamp=i)
+            with open(path, "a") as file:
+                file.write('{"n": "f", "i": [')  # Cut short
+
+            reloaded = History(max_entries=3, path=path)
+            self.assertEqual([(e.inputs, e.result) for e in reloaded],
+                             [((4, 0.5), {"value": 4}), ((5, 0.5), {"value": 5}), ((6, 0.5), {"value": 6})])
+            self.assertEqual(reloaded.lookup("f", (6, 0.5)).timestamp, 6)
+            # The file is rewritten without the dropped evaluations
+            with open(path) as file:
+                self.assertLessEqual(len(file.readlines()), 2 * 3 + 1)
+
+    def test_extension_records_evaluations(self):
+        history = History()
+        formula = Formula(lambda a, b: {"sum": a + b}, (NumInput("a"), NumInput("b")), "test.history.sum")
+        written = []
+        session = Session(reader=mock_reader(["1.2345678", "0.5", "0", "test.history.sum"]),
+                          result_printer=lambda result: None, writer=written.append)
+        session.add_extension(HistoryExtension(history))
+        formula.run(session)
+
+        evaluation, = history.query(name="test.history.sum")
+        self.assertEqual(evaluation.inputs, (1.2345678, 0.5))
+        self.assertEqual(evaluation.result, {"sum": 1.7345678})  # Not the rounded result that was printed
+        self.assertGreaterEqual(evaluation.duration, 0)
+
+        show_history = session.persistent_children[-1]
+        self.assertEqual(show_history.name, "History")
+        written.clear()
+        show_history.run(session)
+        self.assertIn("test.history.sum(1.2345678, 0.5) = {'sum': 1.7345678}", "\n".join(written))
+
+    def test_sessions_sharing_the_extension_in_threads(self):
+        history = History()
+        extension = HistoryExtension(history)
+        fast_done = threading.Event()
+
+        def slow(x):
+            fast_done.wait(5)  # The fast formula starts and ends while this one runs
+            time.sleep(0.05)
+            return x
+
+        def run(func, name):
+            session = Session(writer=lambda line: None)
+            session.add_extension(extension)
+            session.evaluate(Formula(func, (NumInput("x"),), name), [1.0])
+
+        slow_thread = threading.Thread(target=run, args=(slow, "slow"))
+        slow_thread.start()
+        time.sleep(0.05)
+        run(lambda x: x, "fast")
+        fast_done.set()
+        slow_thread.join()
+
+        self.assertLess(history.query(name="fast")[0].duration, 0.05)
+        self.assertGreaterEqual(history.query(name="slow")[0].duration, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
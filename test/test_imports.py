@@ -0,0 +1,62 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import subprocess
+import sys
+import threading
+import unittest
+
+import formula_prompt
+
+
+def imported_modules(code):
+    """Runs the code in a new interpreter and returns the modules it imported."""
+    code += "\nimport sys\nprint(' '.join(sys.modules))"
+    return set(subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+               .stdout.split())
+
+
+class ImportTests(unittest.TestCase):
+    def test_library_use_is_lazy(self):
+        modules = imported_modules("import formula_prompt")
+        self.assertEqual({module for module in modules if module.startswith("formula_prompt")}, {"formula_prompt"})
+
+        modules = imported_modules("from formula_prompt import register_formula, NumInput, evaluate_many\n"
+                                   "register_formula(NumInput('x'), name='a.b')(lambda x: x)\n"
+                                   "evaluate_many('a.b', [(1,), (2,)], backend='serial')")
+        for module in ("formula_prompt.navigation", "formula_prompt.session", "formula_prompt.extensions.memory",
+                       "formula_prompt.tables", "formula_prompt.compiler", "concurrent.futures", "multiprocessing"):
+            self.assertNotIn(module, modules)
+
+    def test_exports(self):
+        for name in formula_prompt.__all__:
+            self.assertIsNotNone(getattr(formula_prompt, name))
+        self.assertIn("evaluate_many", dir(formula_prompt))
+        with self.assertRaises(AttributeError):
+            formula_prompt.not_a_name
+
+    def test_navigation_is_built_on_demand(self):
+        from formula_prompt import setup
+        register = setup.register_formula(formula_prompt.NumInput("x"), name="test.imports.late")
+        register(lambda x: x)
+        folder = setup.NAVIGATION_ROOT.get_subfolder("test").get_subfolder("test.imports")
+        self.assertEqual([child.name for child in folder.children], ["test.imports.late"])
+
+    def test_navigation_built_from_threads(self):
+        from formula_prompt import setup
+
+        def register_and_build(thread):
+            for i in range(20):
+                setup.register_formula(formula_prompt.NumInput("x"), name=f"test.threads.f{thread}_{i}")(lambda x: x)
+                setup.NAVIGATION_ROOT
+
+        threads = [threading.Thread(target=register_and_build, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        folder = setup.NAVIGATION_ROOT.get_subfolder("test").get_subfolder("test.threads")
+        self.assertEqual(sorted(child.name for child in folder.children),
+                         sorted(f"test.threads.f{thread}_{i}" for thread in range(4) for i in range(20)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import csv
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from formula_prompt.core import Formula
+from formula_prompt.ingest import column_name, evaluate_file
+from formula_prompt.inputs import NumInput, PercentInput
+from formula_prompt.validation import BAD_NUMBER, BAD_RESULT, TOO_SMALL
+
+FUTURE_VALUE = Formula(lambda present_value, rate, periods: present_value * (1 + rate) ** periods,
+                       (NumInput("Present value"), PercentInput("rate"), NumInput("Number of periods", min=0)),
+                       "future value")
+
+
+class EvaluateFileTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "source.csv")
+        self.destination = os.path.join(self.directory.name, "destination.csv")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_column_name(self):
+        self.assertEqual(column_name("Present value"), "present_value")
+        self.assertEqual(column_name("rate (percent)"), "rate_percent")
+
+    def test_writes_results_and_errors(self):
+        with open(self.source, "w", newline="") as f:
+            csv.writer(f).writerows([["id", "present_value", "rate", "number_of_periods"],
+                                     ["a", "100", "10", "1"],
+                                     ["b", "oops", "10", "1"],
+                                     ["c", "100", "0.5", "-1"],
+                                     ["d", "200", "0", "3"]])
+
+        report = evaluate_file(FUTURE_VALUE, self.source, self.destination, chunk_size=3)
+        self.assertEqual(report.number_of_rows, 4)
+        self.assertEqual(list(report), [(1, "Present value", BAD_NUMBER), (2, "Number of periods", TOO_SMALL)])
+
+        with open(self.destination, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["id", "present_value", "rate", "number_of_periods", "result", "error"])
+        self.assertAlmostEqual(float(rows[1][4]), 110)
+        self.assertEqual(rows[2][4], "")
+        self.assertTrue(rows[2][5].startswith("Present value"))
+        self.assertTrue(rows[3][5].startswith("Number of periods"))
+        self.assertEqual(rows[4][4:], ["200.0", ""])
+
+    def test_result_columns_found_after_invalid_chunks(self):
+        def halves(x):
+            return {"half": x / 2, "double": x * 2} if x < 10 else {"other": x}
+
+        with open(self.source, "w", newline="") as f:
+            csv.writer(f).writerows([["x"], ["bad"], ["1"], ["2"], ["20"]])
+
+        formula = Formula(halves, (NumInput("x"),), "halves")
+        report = evaluate_file(formula, self.source, self.destination, chunk_size=1)
+        self.assertEqual(list(report), [(0, "x", BAD_NUMBER), (3, None, BAD_RESULT)])
+        with open(self.destination, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["x", "half", "double", "error"])
+        self.assertEqual(rows[2], ["1", "0.5", "2.0", ""])
+        self.assertEqual(rows[3], ["2", "1.0", "4.0", ""])
+        self.assertEqual(rows[4][:3], ["20", "", ""])
+        self.assertTrue(rows[4][3].startswith("Result doesn't match"))
+
+        evaluate_file(formula, self.source, self.destination, chunk_size=1, result_keys=("double", "half"))
+        with open(self.destination, newline="") as f:
+            self.assertEqual(list(csv.reader(f))[:3], [["x", "double", "half", "error"],
+                                                       ["bad", "", "", "x: Invalid number"], ["1", "2.0", "0.5", ""]])
+
+    def test_result_columns_when_no_early_results(self):
+        formula = Formula(lambda x: {"half": x / 2} if x > 0 else None, (NumInput("x"),), "half")
+        with open(self.source, "w", newline="") as f:
+            csv.writer(f).writerows([["x"], ["0"], ["0"], ["0"], ["4"]])
+
+        with mock.patch("formula_prompt.ingest.MAX_PENDING_ROWS", 2):
+            report = evaluate_file(formula, self.source, self.destination, chunk_size=1)
+        self.assertEqual(list(report), [(3, None, BAD_RESULT)])
+        with open(self.destination, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["x", "result", "error"])
+        self.assertEqual(rows[1:4], [["0", "", ""]] * 3)
+        self.assertEqual(rows[4][:2], ["4", ""])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import unittest
+
+from formula_prompt.core import Formula
+from formula_prompt.extensions.memory import FormulaFailed, Memory, Ref, register_memory_extension
+from formula_prompt.inputs import NumInput
+from formula_prompt.session import Session
+from test.utilities import mock_reader
+
+
+class Counted:
+    """Formula that counts how many times it was evaluated."""
+
+    def __init__(self, func, *input_names):
+        self.calls = 0
+
+        def counted(*args):
+            self.calls += 1
+            return func(*args)
+
+        self.formula = Formula(counted, tuple(NumInput(name) for name in input_names), "counted")
+
+
+class MemoryTests(unittest.TestCase):
+    def test_results_are_recomputed_lazily(self):
+        memory = Memory()
+        add = Counted(lambda a, b: a + b, "a", "b")
+        double = Counted(lambda a: 2 * a, "a")
+        memory["x"] = 1.0
+        memory.set_formula("total", add.formula, (Ref("x"), 10.0))
+        memory.set_formula("doubled", double.formula, (Ref("total"),))
+        self.assertEqual((add.calls, double.calls), (0, 0))
+
+        self.assertEqual(memory["doubled"], 22.0)
+        self.assertEqual(memory["doubled"], 22.0)
+        self.assertEqual((add.calls, double.calls), (1, 1))
+
+        memory["x"] = 5.0
+        self.assertEqual((add.calls, double.calls), (1, 1))
+        self.assertEqual(memory["total"], 15.0)
+        self.assertEqual(memory, {"x": 5.0, "total": 15.0, "doubled": 30.0})
+        self.assertEqual((add.calls, double.calls), (2, 2))
+
+        # Replacing a result by a value stops it from depending on other variables
+        memory["total"] = 1.0
+        memory["x"] = 7.0
+        self.assertEqual((memory["total"], memory["doubled"]), (1.0, 2.0))
+        self.assertEqual(add.calls, 2)
+
+    def test_cycles_and_unknown_variables_are_refused(self):
+        memory = Memory()
+        double = Counted(lambda a: 2 * a, "a").formula
+        memory["x"] = 1.0
+        memory.set_formula("y", double, (Ref("x"),))
+        with self.assertRaises(ValueError):
+            memory.set_formula("x", double, (Ref("y"),))
+        with self.assertRaises(KeyError):
+            memory.set_formula("z", double, (Ref("unknown"),))
+        self.assertEqual(memory, {"x": 1.0, "y": 2.0})
+
+    def test_failing_formula_makes_variables_unavailable(self):
+        inverse = Counted(lambda a: 1 / a, "a")
+        memory = Memory()
+        memory["y"] = 2.0
+        memory.set_formula("x", inverse.formula, (Ref("y"),))
+        memory.set_formula("z", inverse.formula, (Ref("x"),))
+        self.assertEqual(memory["z"], 2.0)
+
+        memory["y"] = 0.0
+        self.assertIsNone(memory.get("x"))
+        self.assertIsInstance(memory.error("z"), ZeroDivisionError)
+        self.assertIsInstance(dict(memory.items())["x"], FormulaFailed)
+        with self.assertRaises(KeyError):
+            memory["x"]
+        calls = inverse.calls
+        memory.get("z")
+        self.assertEqual(inverse.calls, calls)  # Not computed again until an input changes
+
+        memory["y"] = 4.0
+        self.assertIsNone(memory.error("z"))
+        self.assertEqual(memory["z"], 4.0)
+
+    def test_unavailable_variable_in_prompt(self):
+        written = []
+        session = Session(reader=mock_reader(["x", "3"]), writer=written.append)
+        register_memory_extension(session)
+        session.memory["y"] = 0.0
+        session.memory.set_formula("x", Formula(lambda a: 1 / a, (NumInput("a"),), "inverse"), (Ref("y"),))
+        self.assertEqual(NumInput("n").read(session), 3.0)
+        session.persistent_children[1].run(session)  # Read from memory
+        self.assertIn("Variable x is unavailable: float division by zero", written)
+        self.assertIn("'x': <unavailable, ZeroDivisionError: float division by zero>", "\n".join(written))
+
+    def test_add_formula_result_from_prompt(self):
+        from formula_prompt.setup import _FORMULAS
+        formula = Formula(lambda a, b: a * b, (NumInput("a"), NumInput("b")), "test.memory.product")
+        _FORMULAS[formula.name] = formula
+        try:
+            captured = []
+            session = Session(reader=mock_reader(["x", "test.memory.product", "rate", "3"]),
+                              result_printer=captured.append, writer=lambda line: None)
+            register_memory_extension(session)
+            session.memory["rate"] = 2.0
+            formula_folder = session.persistent_children[0]
+            formula_folder.children[-1].run(session)
+        finally:
+            del _FORMULAS[formula.name]
+
+        self.assertEqual(captured, [6.0])
+        self.assertEqual(session.memory["x"], 6.0)
+        session.memory["rate"] = 4.0
+        self.assertEqual(session.memory["x"], 12.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import math
+import unittest
+from decimal import Decimal
+from fractions import Fraction
+
+from formula_prompt.core import Formula
+from formula_prompt.cumulative import CumulativeDistribution
+from formula_prompt.inputs import IntInput, NumInput
+from formula_prompt.precision import LogFloat, comb, power, log_comb, log_factorial, evaluate, precision
+from formula_prompt.session import Session
+from test.utilities import mock_reader
+
+
+def binomial(x, n, p):
+    return comb(n, x) * power(p, x) * power(1 - p, n - x)
+
+
+def binomial_ratio(x, n, p):
+    # A single division so that the ratio stays a Fraction in the exact precision
+    return (n - x) * p / ((x + 1) * (1 - p))
+
+
+def negative_binomial(x, k, p):
+    return comb(x - 1, k - 1) * power(p, k) * power(1 - p, x - k)
+
+
+def negative_binomial_ratio(x, k, p):
+    return x * (1 - p) / (x - k + 1)
+
+
+BINOMIAL = Formula(binomial, (IntInput("x"), IntInput("n"), NumInput("p")), "binomial", decimal_places=4, exact=True)
+
+
+class PrecisionTests(unittest.TestCase):
+    def test_log_factorials(self):
+        for n in (0, 1, 10, 1000, 5000, 1 << 21):
+            self.assertTrue(math.isclose(log_factorial(n), math.lgamma(n + 1), rel_tol=1e-14))
+        for n, k in ((10, 3), (1000, 500), (10 ** 6, 100), (10 ** 6, 5000), (10 ** 6, 10 ** 6)):
+            self.assertTrue(math.isclose(log_comb(n, k), math.log(math.comb(n, k)), rel_tol=1e-14, abs_tol=1e-14))
+        self.assertEqual(log_comb(3, 5), -math.inf)
+
+    def test_modes(self):
+        expected = math.comb(10, 3) * 0.3 ** 3 * 0.7 ** 7
+        self.assertEqual(evaluate(BINOMIAL, (3, 10, 0.3), "float"), binomial(3, 10, 0.3))
+        self.assertTrue(math.isclose(float(evaluate(BINOMIAL, (3, 10, 0.3), "log")), expected, rel_tol=1e-12))
+        self.assertEqual(evaluate(BINOMIAL, (3, 10, 0.3), "exact"), 120 * Fraction(3, 10) ** 3 * Fraction(7, 10) ** 7)
+
+        # Too large for floats
+        with self.assertRaises(OverflowError):
+            evaluate(BINOMIAL, (5000, 10000, 0.5), "float")
+        exact = evaluate(BINOMIAL, (5000, 10000, 0.5), "exact")
+        self.assertTrue(math.isclose(float(evaluate(BINOMIAL, (5000, 10000, 0.5), "log")), exact, rel_tol=1e-10))
+        tiny = evaluate(BINOMIAL, (10, 100000, 0.5), "log")
+        self.assertEqual(float(tiny), 0.0)
+        self.assertEqual(str(BINOMIAL.round_result(tiny)), "2.7572e-30060")
+
+    def test_log_float_arithmetic(self):
+        a, b = LogFloat.from_value(3.0), LogFloat.from_value(1.5)
+        for result, expected in ((a + b, 4.5), (a - b, 1.5), (a * b, 4.5), (a / b, 2.0), (a ** 2, 9.0),
+                                 (2 * a, 6.0), (1 + b, 2.5), (6 / a, 2.0), (a - a, 0.0)):
+            self.assertAlmostEqual(float(result), expected)
+        self.assertTrue(b < a and a == 3 and a > 0 and not LogFloat(-math.inf))
+        with self.assertRaises(ValueError):
+            b - a
+
+    def test_round_result(self):
+        formula = Formula(None, (), "f", decimal_places=2)
+        self.assertEqual(formula.round_result(Fraction(2, 3)), Decimal("0.67"))
+        self.assertEqual(formula.round_result({"a": Decimal("1.005"), "b": 1.234, "c": 3}),
+                         {"a": Decimal("1.00"), "b": 1.23, "c": 3})
+        self.assertEqual(formula.round_result(LogFloat.from_value(1.2345)), 1.23)
+
+    def test_cumulative_and_session(self):
+        cumulative = CumulativeDistribution(binomial, binomial_ratio)
+        floats = cumulative(3, 10, 0.3)
+        with precision("log"):
+            self.assertIsInstance(cumulative(3, 10, 0.3), LogFloat)
+        self.assertEqual(cumulative(3, 10, 0.3), floats)
+
+        captured = []
+        session = Session(reader=mock_reader(["3", "10", "0.3", "0"]), result_printer=captured.append,
+                          precision="exact", writer=lambda line: None)
+        BINOMIAL.run(session)
+        self.assertEqual(captured, [Decimal("0.2668")])
+        with self.assertRaises(ValueError):
+            Session(precision="double")
+
+    def test_exact_cumulative(self):
+        cumulative = CumulativeDistribution(binomial, binomial_ratio)
+        binomial_cumulative = Formula(cumulative, BINOMIAL.inputs, "binomial.cumulative", exact=True)
+        result = evaluate(binomial_cumulative, (3, 10, 0.3), "exact")
+        self.assertIsInstance(result, Fraction)
+        self.assertEqual(result, sum(binomial(x, 10, Fraction(3, 10)) for x in range(4)))
+
+        cumulative = CumulativeDistribution(negative_binomial, negative_binomial_ratio, start=lambda k, p: k)
+        negative_binomial_cumulative = Formula(cumulative, (IntInput("x"), IntInput("k"), NumInput("p")),
+                                               "negative_binomial.cumulative", exact=True)
+        self.assertEqual(evaluate(negative_binomial_cumulative, (6, 3, 0.3), "exact"), Fraction("0.25569"))
+
+    def test_exact_only_for_formulas_that_opt_in(self):
+        input_type = Formula(lambda x: type(x).__name__, (NumInput("x"),), "type")
+        self.assertEqual(evaluate(input_type, (0.5,), "exact"), "float")
+        input_type.exact = True
+        self.assertEqual(evaluate(input_type, (0.5,), "exact"), "Fraction")
+
+    def test_caches_are_bounded(self):
+        from formula_prompt import precision as module
+        module._cached_factorial.cache_clear()
+        module._cached_comb.cache_clear()
+        self.assertEqual(module._exact_factorial(600), math.factorial(600))
+        self.assertEqual(module._exact_comb(5000, 2500), math.comb(5000, 2500))
+        self.assertEqual(module._exact_comb(100, 50), math.comb(100, 50))
+        self.assertEqual(module._cached_factorial.cache_info().currsize, 0)
+        self.assertEqual(module._cached_comb.cache_info().currsize, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import contextlib
+import io
+import threading
+import unittest
+
+from formula_prompt.core import Formula
+from formula_prompt.extensions.memory import register_memory_extension
+from formula_prompt.inputs import NumInput
+from formula_prompt.session import Session
+from test.utilities import mock_reader
+
+SQUARE = Formula(lambda x: x * x, (NumInput("x"),), "square")
+
+
+class SessionTests(unittest.TestCase):
+    def test_sessions_run_in_parallel(self):
+        results = {}
+
+        def run(session_number):
+            values = list(range(session_number, session_number + 200))
+            captured = []
+            # Enter each value then press enter to run again, finally 0 to return
+            reader = mock_reader([line for value in values for line in (value, "")][:-1] + ["0"])
+            written = []
+            SQUARE.run(Session(reader=reader, result_printer=captured.append, writer=written.append))
+            results[session_number] = (values, captured, written)
+
+        threads = [threading.Thread(target=run, args=(i * 1000,)) for i in range(4)]
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # Every session writes its own prompts and messages, nothing goes to stdout
+        self.assertEqual(stdout.getvalue(), "")
+        for values, captured, written in results.values():
+            self.assertEqual(captured, [float(value) ** 2 for value in values])
+            self.assertEqual(written[:3], ["Input x:", "square:", "\nEnter to run again or 0 to return..."])
+            self.assertEqual(len(written), 3 * len(values))
+
+    def test_memory_is_per_session(self):
+        written = []
+        first = Session(reader=mock_reader(["a", "0"]), writer=written.append)
+        second = Session(reader=mock_reader(["2", "0"]), writer=written.append)
+        for session in (first, second, first):
+            register_memory_extension(session)
+        first.memory["a"] = 3.0
+        self.assertEqual(len(first.preprocesses), 1)
+
+        captured = []
+        first.result_printer = second.result_printer = captured.append
+        SQUARE.run(first)
+        SQUARE.run(second)
+        self.assertEqual(captured, [9.0, 4.0])
+        self.assertEqual(second.memory, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
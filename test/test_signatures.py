@@ -0,0 +1,66 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import unittest
+from typing import List, Optional
+
+try:
+    from typing import Annotated
+except ImportError:  # Python 3.8
+    Annotated = None
+
+from formula_prompt.inputs import IntInput, ListInput, NumInput, PercentInput
+from formula_prompt.signatures import Bounds, Percent, infer_inputs, make_caller
+
+
+class InferInputsTests(unittest.TestCase):
+    @unittest.skipIf(Annotated is None, "requires typing.Annotated (Python 3.9+)")
+    def test_infers_from_type_hints(self):
+        def formula(present_value: float, periods: Annotated[int, Bounds(min=1)], rate: Annotated[float, Percent],
+                    sample: List[float], face_value: Optional[float] = None):
+            pass
+
+        inputs = infer_inputs(formula)
+        self.assertEqual([type(i) for i in inputs], [NumInput, IntInput, PercentInput, ListInput, NumInput])
+        self.assertEqual([i.name for i in inputs], ["present value", "periods", "rate", "sample", "face value"])
+        self.assertEqual(inputs[1].min, 1)
+        self.assertEqual([i.optional for i in inputs], [False, False, False, False, True])
+
+    @unittest.skipIf(Annotated is None, "requires typing.Annotated (Python 3.9+)")
+    def test_explicit_input_in_annotation(self):
+        rate_input = NumInput("rate", min=0)
+
+        def formula(rate: Annotated[float, rate_input]):
+            pass
+
+        self.assertIs(infer_inputs(formula)[0], rate_input)
+
+    @unittest.skipIf(Annotated is None, "requires typing.Annotated (Python 3.9+)")
+    def test_bounds_need_min_and_max(self):
+        def percent(rate: Annotated[float, Percent, Bounds(min=0)]):
+            pass
+
+        def sample(values: Annotated[list, Bounds(max=10)]):
+            pass
+
+        for formula in (percent, sample):
+            with self.assertRaisesRegex(TypeError, "Bounds can't be used for parameter"):
+                infer_inputs(formula)
+
+    def test_missing_type_hint(self):
+        with self.assertRaises(TypeError):
+            infer_inputs(lambda x: x)
+
+
+class MakeCallerTests(unittest.TestCase):
+    def test_arity_checked_once(self):
+        with self.assertRaises(TypeError):
+            make_caller(lambda a, b: a + b, (NumInput(),), "add")
+        with self.assertRaises(TypeError):
+            make_caller(lambda a: a, (NumInput(), NumInput()), "identity")
+
+    def test_keyword_only_parameters(self):
+        call = make_caller(lambda a, *, b: a - b, (NumInput(), NumInput()), "subtract")
+        self.assertEqual(call(5, 3), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
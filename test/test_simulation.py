@@ -0,0 +1,93 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import math
+import unittest
+
+from formula_prompt.core import Formula
+from formula_prompt.inputs import IntInput, NumInput, PercentInput
+from formula_prompt.setup import _compile
+from formula_prompt.simulation import simulate, Normal, Uniform, Choice, Summary
+
+
+def annuity_factor(N, r):
+    factor = (1 - (1 + r) ** (-N)) / r
+    return {"P/A": factor, "A/P": 1 / factor}
+
+
+INPUTS = (NumInput("number of periods"), PercentInput("rate"))
+ANNUITY = Formula(annuity_factor, INPUTS, "annuity")
+COMPILED_ANNUITY = Formula(annuity_factor, INPUTS, "annuity", call=_compile(annuity_factor, INPUTS, "annuity"))
+
+
+class SimulationTests(unittest.TestCase):
+    def test_summary(self):
+        for formula in (ANNUITY, COMPILED_ANNUITY):
+            summaries = simulate(formula, {"number of periods": 10, "rate": Normal(0.05, 0.01)},
+                                 samples=50_000, seed=1, chunk_size=8192)
+            summary = summaries["P/A"]
+            self.assertEqual(summary.count, 50_000)
+            self.assertAlmostEqual(summary.mean, 7.73, delta=0.01)
+            self.assertAlmostEqual(summary.quantile(0.5), annuity_factor(10, 0.05)["P/A"], delta=0.02)
+            self.assertLess(summary.quantiles[0.05], summary.quantiles[0.95])
+            self.assertTrue(summary.min <= summary.quantile(0) and summary.quantile(1) <= summary.max)
+
+            # The same seed gives the same results
+            again = simulate(formula, {"number of periods": 10, "rate": Normal(0.05, 0.01)},
+                             samples=50_000, seed=1, chunk_size=8192)["P/A"]
+            self.assertEqual((again.mean, again.std), (summary.mean, summary.std))
+
+    def test_uniform_quantiles(self):
+        summary = simulate(Formula(lambda x: x, (NumInput("x"),), "x"), {"x": Uniform(0, 1)}, samples=200_000, seed=2)
+        self.assertAlmostEqual(summary.mean, 0.5, delta=0.005)
+        self.assertAlmostEqual(summary.variance, 1 / 12, delta=0.002)
+        for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+            self.assertAlmostEqual(summary.quantile(q), q, delta=0.005)
+
+    def test_failures_and_errors(self):
+        inverse = Formula(lambda x: 1 / x, (NumInput("x"),), "inverse")
+        summary = simulate(inverse, {"x": Choice([0, 1, 2], weights=[1, 2, 1])}, samples=4000, seed=3)
+        self.assertEqual(summary.count + summary.failed, 4000)
+        self.assertAlmostEqual(summary.failed / 4000, 0.25, delta=0.03)
+        self.assertEqual((summary.min, summary.max), (0.5, 1.0))
+
+        with self.assertRaises(ValueError):
+            simulate(ANNUITY, {"rate": 0.05}, samples=10)
+        with self.assertRaises(ValueError):
+            simulate(ANNUITY, {"number of periods": 10, "rate": 0.05, "other": 1}, samples=10)
+
+    def test_input_rules(self):
+        # Samples of integer inputs are rounded, samples out of the bounds aren't evaluated
+        choose = Formula(lambda n: math.comb(n, 3), (IntInput("n", min=3),), "choose")
+        summary = simulate(choose, {"n": Uniform(0, 10)}, samples=4000, seed=4)
+        self.assertEqual(summary.failed, 0)
+        self.assertEqual(summary.count + summary.out_of_range, 4000)
+        self.assertAlmostEqual(summary.out_of_range / 4000, 0.25, delta=0.03)
+        self.assertEqual((summary.min, summary.max), (1, 120))
+        self.assertIn("out of range", str(summary))
+
+        summary = simulate(ANNUITY, {"number of periods": 10, "rate": Uniform(-0.5, 0.5)}, samples=4000, seed=5)
+        self.assertAlmostEqual(summary["P/A"].out_of_range / 4000, 0.5, delta=0.03)
+        # Fixed values are read like in the prompt, 5 for a percent is 5%
+        summary = simulate(ANNUITY, {"number of periods": Uniform(9, 11), "rate": 5}, samples=100, seed=5)
+        self.assertAlmostEqual(summary["P/A"].mean, annuity_factor(10, 0.05)["P/A"], delta=0.5)
+        with self.assertRaises(ValueError):
+            simulate(choose, {"n": 2}, samples=10)
+
+    def test_first_chunk_fails(self):
+        def inverse(x):
+            return {"inverse": 1 / x}
+
+        formula = Formula(inverse, (NumInput("x"),), "inverse")
+        summaries = simulate(formula, {"x": Choice([0, 1])}, samples=1000, seed=6, chunk_size=1)
+        summary = summaries["inverse"]
+        self.assertEqual(summary.count + summary.failed, 1000)
+        self.assertEqual(summary.mean, 1.0)
+
+    def test_merged_chunks(self):
+        summary = Summary()
+        for chunk in ([1.0, 2.0], [3.0], [4.0, float("nan"), 5.0]):
+            summary.add(chunk)
+        self.assertEqual((summary.count, summary.failed, summary.mean, summary.variance), (5, 1, 3.0, 2.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
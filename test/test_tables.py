@@ -0,0 +1,114 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import math
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from formula_prompt.core import Formula
+from formula_prompt.inputs import IntInput, NumInput
+from formula_prompt.tables import LookupTable, _cache_directory
+
+
+def power(x, n):
+    return x ** n
+
+
+def helper(x):
+    return x + 1
+
+
+def uses_helper(x):
+    return helper(x) * 2
+
+
+class LookupTableTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "power.table")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_formula(self):
+        table = LookupTable(points=512, tolerance=1e-4, path=self.path)
+        return Formula(power, [NumInput("x", min=0, max=2), IntInput("n", min=0, max=4)], "power", table=table)
+
+    def test_interpolates_within_tolerance(self):
+        formula = self.make_formula()
+        for x in (0.1, 0.77, 1.5, 1.999):
+            for n in range(5):
+                self.assertLessEqual(abs(formula.evaluate(x, n) - x ** n), 1e-4 * max(1, x ** n))
+
+    def test_falls_back_outside_grid(self):
+        formula = self.make_formula()
+        self.assertEqual(formula.evaluate(3.0, 2), 9.0)
+        self.assertEqual(formula.evaluate(1.5, 7), 1.5 ** 7)
+
+    def test_reuses_saved_table(self):
+        self.make_formula().evaluate(1.0, 1)
+        modified_time = os.path.getmtime(self.path)
+        formula = self.make_formula()
+        self.assertTrue(math.isclose(formula.evaluate(1.25, 2), 1.5625, rel_tol=1e-4))
+        self.assertEqual(os.path.getmtime(self.path), modified_time)
+
+    def test_threads_wait_for_the_build(self):
+        calls = []
+        cells_started = threading.Event()
+
+        def slow_square(x):
+            calls.append(x)
+            if len(calls) > 64:  # The grid points are computed, the cells are being checked
+                cells_started.set()
+                time.sleep(0.001)
+            return x * x
+
+        formula = Formula(slow_square, [NumInput("x", min=0, max=1)], "slow square",
+                          table=LookupTable(points=64, tolerance=1e-2, path=self.path))
+        errors = []
+
+        def evaluate():
+            try:
+                for _ in range(20):
+                    self.assertAlmostEqual(formula.evaluate(0.5), 0.25, delta=1e-2)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=evaluate) for _ in range(4)]
+        threads[0].start()
+        cells_started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_key_follows_called_functions(self):
+        table = LookupTable()
+        Formula(uses_helper, [NumInput("x", min=0, max=1)], "helper", table=table)
+        key = table._key()
+        self.assertEqual(table._key(), key)
+        with mock.patch(f"{__name__}.helper", lambda x: x + 2):
+            self.assertNotEqual(table._key(), key)
+
+    @unittest.skipIf(sys.platform == "win32", "POSIX permissions")
+    def test_cache_directory_is_private(self):
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.directory.name}):
+            directory = _cache_directory()
+            self.assertEqual(directory, os.path.join(self.directory.name, "formula_prompt"))
+            self.assertEqual(stat.S_IMODE(os.stat(directory).st_mode) & 0o077, 0)
+            os.chmod(directory, 0o777)
+            with self.assertRaises(PermissionError):
+                _cache_directory()
+
+    def test_requires_range(self):
+        with self.assertRaises(ValueError):
+            Formula(power, [NumInput("x"), IntInput("n")], "power", table=LookupTable())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+#  Copyright (c) 2021 Martin Staadecker under the MIT License
+import unittest
+
+from formula_prompt.inputs import IntInput, ListInput, NumInput, PercentInput
+from formula_prompt.validation import BAD_NUMBER, INVALID_PERCENT, MISSING, TOO_BIG, TOO_SMALL, VALID, \
+    ErrorReport, to_float, to_int, validate_column
+
+
+class ValidationTests(unittest.TestCase):
+    def test_number_syntax_matches_python(self):
+        for text in ("1", "-2.5", " 3 ", "1e5", ".5", "5.", "1_000", "inf", "-Infinity", "nan",
+                     "", "abc", "1.2.3", "e5", "1__0", "_1", "1e", "--1", "0x10",
+                     ".-5", ".+5", "-.5", "+.", ".", "5.-", "-5.5"):
+            try:
+                expected = float(text), VALID
+            except ValueError:
+                expected = None, BAD_NUMBER
+            self.assertEqual(repr(to_float(text)), repr(expected), text)
+
+            try:
+                expected = int(text), VALID
+            except ValueError:
+                expected = None, BAD_NUMBER
+            self.assertEqual(to_int(text), expected, text)
+
+    def test_validate_column(self):
+        values, codes = validate_column(NumInput("x", min=0, max=10), ["5", "", "-1", "11", "x", 7])
+        self.assertEqual(values, [5.0, None, None, None, None, 7.0])
+        self.assertEqual(list(codes), [VALID, MISSING, TOO_SMALL, TOO_BIG, BAD_NUMBER, VALID])
+
+        self.assertEqual(list(validate_column(PercentInput(optional=True), ["50", "", "500"])[1]),
+                         [VALID, VALID, INVALID_PERCENT])
+        self.assertEqual(validate_column(IntInput(), [3.0, 3.5])[1], bytearray([VALID, BAD_NUMBER]))
+        self.assertEqual(validate_column(ListInput(), ["1; 2 3", "1;a"]), ([[1.0, 2.0, 3.0], None],
+                                                                         bytearray([VALID, BAD_NUMBER])))
+
+    def test_error_report(self):
+        report = ErrorReport(["x", "y"])
+        report.add_column(10, 1, bytearray([VALID, TOO_BIG, VALID, BAD_NUMBER]))
+        report.number_of_rows = 4
+        self.assertEqual(list(report), [(11, "y", TOO_BIG), (13, "y", BAD_NUMBER)])
+        self.assertEqual(str(report), "4 rows, 2 errors (1 invalid number, 1 too big)")
+
+
+if __name__ == '__main__':
+    unittest.main()
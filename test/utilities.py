@@ -1,22 +1,21 @@
 #  Copyright (c) 2021 Martin Staadecker under the MIT License
-from formula_prompt.inputs import Input
-from formula_prompt.core import Formula
+from formula_prompt.session import Session
 from formula_prompt.setup import launch_prompt
 
 
 def mock_reader(inputs):
-    """Takes a list of inputs and that's what the reader will read"""
+    """Takes a list of inputs and returns a reader that will read them"""
     iter_inputs = iter(inputs)
 
     def reader():
         return str(next(iter_inputs))
 
-    Input.overwrite_reader(reader)
+    return reader
 
 
-def run_and_capture(capture_func):
-    Formula.override_print_result(capture_func)
+def run_and_capture(reader, capture_func):
+    """Runs the prompt in a new session that reads from reader and passes the results to capture_func"""
     try:
-        launch_prompt()
+        launch_prompt(session=Session(reader=reader, result_printer=capture_func))
     except StopIteration:
         pass